@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark da montagem de páginas de create_pdf_from_images
+Compara o custo por página de add_image_page (JPEG embutido direto na página)
+com a montagem antiga (um documento temporário por imagem copiado com insert_pdf)
+Uso: python benchmark_pages.py [--paginas 200] [--repeticoes 5]
+"""
+
+import io
+import time
+import argparse
+
+import fitz  # PyMuPDF
+import numpy as np
+from PIL import Image
+
+from create_pdf_from_images import add_image_page, get_image_dpi, DEFAULT_PAGE_DPI
+
+def make_sample_jpeg(seed, width=1000, height=700, quality=85):
+    """JPEG de teste com gradiente e ruído (tamanho típico de uma página otimizada)"""
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(0, 255, width, dtype=np.float64)[None, :, None]
+    pixels = np.clip(gradient + rng.normal(0, 20, (height, width, 3)), 0, 255).astype(np.uint8)
+    img_buffer = io.BytesIO()
+    Image.fromarray(pixels).save(img_buffer, format='JPEG', quality=quality, optimize=True)
+    return img_buffer.getvalue()
+
+def add_image_page_temporary_document(doc, img_bytes):
+    """Montagem antiga: abre a imagem como documento, converte para PDF e copia a página"""
+    with Image.open(io.BytesIO(img_bytes)) as img:
+        width_px, height_px = img.size
+        dpi_x, dpi_y = get_image_dpi(img) or (DEFAULT_PAGE_DPI, DEFAULT_PAGE_DPI)
+    img_doc = fitz.open(stream=img_bytes, filetype="jpeg")
+    pdf_doc = fitz.open("pdf", img_doc.convert_to_pdf())
+    img_doc.close()
+    # Mesmo tamanho de página da montagem direta, para comparar só o custo de montagem
+    pdf_doc[0].set_mediabox(fitz.Rect(0, 0, width_px * 72 / dpi_x, height_px * 72 / dpi_y))
+    doc.insert_pdf(pdf_doc)
+    pdf_doc.close()
+
+def build_document(add_page, pages):
+    """Monta um documento com as páginas e retorna (segundos, bytes gravados, retângulos)"""
+    start = time.perf_counter()
+    doc = fitz.open()
+    for img_bytes in pages:
+        add_page(doc, img_bytes)
+    elapsed = time.perf_counter() - start
+    rects = [tuple(page.rect) for page in doc]
+    data = doc.tobytes(garbage=4, deflate=True)
+    doc.close()
+    return elapsed, len(data), rects
+
+def main():
+    """Função principal"""
+    parser = argparse.ArgumentParser(description="Mede o custo por página da montagem de PDFs de imagens")
+    parser.add_argument("--paginas", type=int, default=200, help="páginas por documento")
+    parser.add_argument("--repeticoes", type=int, default=5, help="repetições (vale a melhor)")
+    args = parser.parse_args()
+
+    # Imagens distintas: o PyMuPDF reaproveitaria um stream repetido
+    pages = [make_sample_jpeg(seed) for seed in range(args.paginas)]
+    methods = [
+        ("documento temporário por página", add_image_page_temporary_document),
+        ("add_image_page (insert_image direto)", add_image_page),
+    ]
+
+    print(f"⏱️  {args.paginas} páginas JPEG 1000x700, melhor de {args.repeticoes} (só a montagem)")
+    results = []
+    for name, add_page in methods:
+        runs = [build_document(add_page, pages) for _ in range(args.repeticoes)]
+        best = min(run[0] for run in runs)
+        _elapsed, size, rects = runs[0]
+        results.append((size, rects))
+        print(f"   {name}: {best * 1000 / args.paginas:.2f} ms/página, PDF de {size / 1024:.0f}KB")
+
+    same_rects = results[0][1] == results[1][1]
+    print(f"   Retângulos das páginas idênticos: {'sim' if same_rects else 'não'}")
+
+if __name__ == "__main__":
+    main()
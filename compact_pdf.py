@@ -16,10 +16,19 @@ import pikepdf
 from pathlib import Path
 import time
 import shutil
+import hashlib
+import io
+import zlib
+import signal
+import contextlib
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from PIL import Image
 
-def get_file_size_mb(file_path):
-    """Retorna o tamanho do arquivo em MB"""
-    return os.path.getsize(file_path) / (1024 * 1024)
+from pdf_common import (encode_jpeg, encode_to_quality_target, get_file_size_mb, write_pdf_parts, get_part_path,
+                        find_pdf_parts, remove_pdf_outputs, PipelineMetrics, iter_prefetched)
 
 def safe_rename(src, dst):
     """Renomeia arquivo removendo o destino se existir"""
@@ -57,55 +66,298 @@ def compress_pdf_simple(input_path, output_path):
         print(f"   ⚠️  Erro na compressão: {e}")
         return False
 
-def compress_pdf_aggressive(input_path, output_path, image_quality=60):
+def get_font_program_bytes(pdf):
+    """
+    Soma o tamanho (em bytes) dos programas de fonte embutidos num PDF aberto com pikepdf
+    """
+    total = 0
+    seen = set()
+    for obj in pdf.objects:
+        if not isinstance(obj, pikepdf.Dictionary) or obj.get("/Type") != "/FontDescriptor":
+            continue
+        for key in ("/FontFile", "/FontFile2", "/FontFile3"):
+            font_file = obj.get(key)
+            if font_file is None or font_file.objgen in seen:
+                continue
+            seen.add(font_file.objgen)
+            total += len(font_file.read_raw_bytes())
+    return total
+
+def deduplicate_fonts(pdf):
+    """
+    Unifica programas de fonte idênticos embutidos várias vezes no PDF
+    Retorna a quantidade de fontes duplicadas removidas
+    """
+    canonical = {}
+    merged = 0
+    for obj in pdf.objects:
+        if not isinstance(obj, pikepdf.Dictionary) or obj.get("/Type") != "/FontDescriptor":
+            continue
+        for key in ("/FontFile", "/FontFile2", "/FontFile3"):
+            font_file = obj.get(key)
+            if font_file is None or not font_file.is_indirect:
+                continue
+            # Mesma sequência de bytes e mesmo formato = mesmo programa de fonte
+            signature = (
+                key,
+                str(font_file.get("/Subtype", "")),
+                str(font_file.get("/Filter", "")),
+                hashlib.sha256(font_file.read_raw_bytes()).hexdigest(),
+            )
+            original = canonical.setdefault(signature, font_file)
+            if original.objgen != font_file.objgen:
+                obj[key] = original
+                merged += 1
+    return merged
+
+def optimize_fonts(input_path, output_path):
+    """
+    Otimiza as fontes embutidas no PDF:
+    unifica programas de fonte duplicados e reduz cada fonte aos glifos usados
+    """
+    temp_path = str(output_path).replace('.pdf', '_fonts.pdf')
+    try:
+        # Passo 1: remove programas de fonte repetidos (comum em PDFs de suítes de escritório)
+        with pikepdf.open(input_path) as pdf:
+            font_bytes_before = get_font_program_bytes(pdf)
+            if font_bytes_before == 0:
+                print(f"     ℹ️  Nenhuma fonte embutida encontrada")
+                return False
+            merged = deduplicate_fonts(pdf)
+            pdf.save(temp_path)
+
+        # Passo 2: subconjunto de glifos efetivamente usados
+        doc = fitz.open(temp_path)
+        try:
+            doc.subset_fonts()
+        except Exception as e:
+            print(f"     ⚠️  Subconjunto de fontes indisponível: {e}")
+        doc.save(
+            output_path,
+            garbage=4,
+            deflate=True,
+            clean=True,
+            pretty=False
+        )
+        doc.close()
+
+        with pikepdf.open(output_path) as pdf:
+            font_bytes_after = get_font_program_bytes(pdf)
+
+        print(f"     🔤 Fontes: {font_bytes_before / 1024:.0f}KB → {font_bytes_after / 1024:.0f}KB"
+              f" ({merged} duplicada(s) unificada(s))")
+        return True
+
+    except Exception as e:
+        print(f"   ⚠️  Erro na otimização de fontes: {e}")
+        return False
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+# Imagens menores que isso não compensam a recompressão (ícones, logotipos)
+MIN_IMAGE_PIXELS = 64 * 64
+MIN_IMAGE_BYTES = 4 * 1024
+
+def get_image_info(doc, xref):
+    """
+    Coleta as informações de uma imagem do PDF necessárias para decidir se vale recomprimi-la
+    """
+    filter_type, filter_value = doc.xref_get_key(xref, "Filter")
+    width = int(doc.xref_get_key(xref, "Width")[1])
+    height = int(doc.xref_get_key(xref, "Height")[1])
+    return {
+        'xref': xref,
+        'width': width,
+        'height': height,
+        'filter': filter_value if filter_type == "name" else filter_type,
+        'raw_size': len(doc.xref_stream_raw(xref)),
+        'has_smask': doc.xref_get_key(xref, "SMask")[0] != "null",
+        'has_decode': doc.xref_get_key(xref, "Decode")[0] != "null",
+        'is_mask': doc.xref_get_key(xref, "ImageMask")[1] == "true",
+    }
+
+def expected_jpeg_bpp(image_quality):
+    """
+    Estimativa de bits por pixel de um JPEG colorido na qualidade informada
+    """
+    return 0.2 + image_quality / 45
+
+def should_skip_image(info, image_quality):
+    """
+    Decide se a recompressão de uma imagem não compensa
+    Retorna o motivo para pular ou None se a imagem deve ser recomprimida
+    """
+    pixels = info['width'] * info['height']
+    if info['is_mask'] or info['has_decode']:
+        return "máscara/decodificação especial"
+    if pixels < MIN_IMAGE_PIXELS or info['raw_size'] < MIN_IMAGE_BYTES:
+        return "imagem pequena"
+    if info['filter'] not in ("/DCTDecode", "/JPXDecode") and info['has_smask']:
+        # Imagem sem perdas com transparência: JPEG degradaria a imagem
+        return "imagem sem perdas com transparência"
+    bpp = info['raw_size'] * 8 / pixels
+    if info['filter'] == "/DCTDecode" and bpp <= expected_jpeg_bpp(image_quality):
+        return "JPEG já compacto"
+    return None
+
+def recompress_image_bytes(image_bytes, image_quality, size=None, quality_target=None):
+    """
+    Recomprime os bytes de uma imagem como JPEG, reduzindo-a para size (largura, altura) se informado
+    Com quality_target (ex.: {'ssim': 0.99}), usa a menor qualidade até image_quality que o atinge
+    Retorna (bytes_jpeg, número_de_componentes, métricas); métricas é None sem quality_target
+    """
+    pil_image = Image.open(io.BytesIO(image_bytes))
+    
+    # Mantém tons de cinza; demais modos viram RGB
+    if pil_image.mode not in ("L", "RGB"):
+        pil_image = pil_image.convert("L" if pil_image.mode in ("1", "LA") else "RGB")
+    if size and size != pil_image.size:
+        pil_image = pil_image.resize(size, Image.Resampling.LANCZOS)
+    
+    components = 1 if pil_image.mode == "L" else 3
+    if quality_target:
+        jpeg_bytes, metrics = encode_to_quality_target(pil_image, image_quality, quality_target)
+        return jpeg_bytes, components, metrics
+    return encode_jpeg(pil_image, image_quality), components, None
+
+def print_image_metrics(xref, width, height, jpeg_bytes, metrics):
+    """Exibe a qualidade escolhida e as métricas perceptuais de uma imagem recomprimida"""
+    status_icon = "🔍" if metrics['met'] else "⚠️ "
+    print(f"     {status_icon} Imagem {xref} ({width}x{height}): qualidade {metrics['quality']}%, "
+          f"SSIM {metrics['ssim']:.3f}, PSNR {metrics['psnr']:.1f}dB, {len(jpeg_bytes) / 1024:.0f}KB")
+
+def replace_image_stream(doc, xref, jpeg_bytes, components, original_components, size=None):
+    """
+    Substitui o stream de uma imagem por um JPEG, ajustando o dicionário da imagem
+    size informa as novas dimensões quando a imagem foi reduzida
+    """
+    doc.update_stream(xref, jpeg_bytes, compress=False)
+    doc.xref_set_key(xref, "Filter", "/DCTDecode")
+    doc.xref_set_key(xref, "DecodeParms", "null")
+    doc.xref_set_key(xref, "BitsPerComponent", "8")
+    if size:
+        doc.xref_set_key(xref, "Width", str(size[0]))
+        doc.xref_set_key(xref, "Height", str(size[1]))
+    # Espaço de cores original só é mantido se tiver o mesmo número de componentes
+    if components != original_components:
+        doc.xref_set_key(xref, "ColorSpace", "/DeviceGray" if components == 1 else "/DeviceRGB")
+
+def recompress_image_job(job):
+    """
+    Recomprime uma imagem extraída do PDF (executável em processo separado)
+    Recebe (xref, bytes_da_imagem, qualidade, dimensões_ou_None, alvo_perceptual_ou_None)
+    e retorna (xref, bytes_jpeg, componentes, métricas, tempo_cpu, erro)
+    """
+    xref, image_bytes, image_quality, size, quality_target = job
+    start = time.process_time()
+    try:
+        new_bytes, components, metrics = recompress_image_bytes(image_bytes, image_quality, size, quality_target)
+        return xref, new_bytes, components, metrics, time.process_time() - start, None
+    except Exception as e:
+        return xref, None, 0, None, time.process_time() - start, str(e)
+
+def iter_recompressed_images(jobs, workers=1):
+    """
+    Executa recompress_image_job para cada imagem, mantendo a ordem de entrada
+    Com workers > 1 usa um pool de processos com poucas imagens em memória por vez
+    """
+    if workers <= 1:
+        for job in jobs:
+            yield recompress_image_job(job)
+        return
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for job in jobs:
+            pending.append(executor.submit(recompress_image_job, job))
+            # Limita as imagens em trânsito para não carregar o PDF inteiro na memória
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def compress_pdf_aggressive(input_path, output_path, image_quality=60, workers=1, quality_target=None):
     """
     Comprime PDF de forma mais agressiva para atingir limite de tamanho
+    Pula imagens em que a recompressão não compensa e nunca aumenta um stream
+    Com workers > 1 recomprime as imagens em paralelo (resultado idêntico ao modo serial)
+    Com quality_target, cada imagem usa a menor qualidade até image_quality que atinge o alvo
     """
     try:
         doc = fitz.open(input_path)
         
+        recompressed = 0
+        kept_original = 0
+        skipped_pixels = 0
+        skip_reasons = {}
+        work_pixels = 0
+        work_time = 0.0
+        candidates = {}
+        
+        def extract_jobs():
+            """Extrai, na ordem das páginas, as imagens que valem ser recomprimidas"""
+            nonlocal skipped_pixels
+            processed_xrefs = set()
+            for page in doc:
+                for img in page.get_images():
+                    xref = img[0]
+                    # Imagens compartilhadas entre páginas são tratadas uma única vez
+                    if xref in processed_xrefs:
+                        continue
+                    processed_xrefs.add(xref)
+                    try:
+                        info = get_image_info(doc, xref)
+                        reason = should_skip_image(info, image_quality)
+                        if reason:
+                            skip_reasons[reason] = skip_reasons.get(reason, 0) + 1
+                            skipped_pixels += info['width'] * info['height']
+                            continue
+                        
+                        # Extrai a imagem
+                        base_image = doc.extract_image(xref)
+                        info['components'] = base_image["colorspace"]
+                        candidates[xref] = info
+                        yield xref, base_image["image"], image_quality, None, quality_target
+                    except Exception as e:
+                        print(f"     ⚠️  Erro ao extrair imagem {xref}: {e}")
+        
         # Comprime imagens mais agressivamente
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            image_list = page.get_images()
+        for xref, new_bytes, components, metrics, cpu_time, error in iter_recompressed_images(extract_jobs(), workers):
+            info = candidates.pop(xref)
+            work_time += cpu_time
+            work_pixels += info['width'] * info['height']
+            if error:
+                print(f"     ⚠️  Erro ao comprimir imagem {xref}: {error}")
+                continue
             
-            for img_index, img in enumerate(image_list):
-                xref = img[0]
-                try:
-                    # Extrai a imagem
-                    base_image = doc.extract_image(xref)
-                    image_bytes = base_image["image"]
-                    image_ext = base_image["ext"]
-                    
-                    # Converte para PIL Image
-                    from PIL import Image
-                    import io
-                    
-                    pil_image = Image.open(io.BytesIO(image_bytes))
-                    
-                    # Reduz qualidade se for JPEG ou converte para JPEG
-                    if pil_image.mode in ("RGBA", "LA", "P"):
-                        pil_image = pil_image.convert("RGB")
-                    
-                    # Salva com qualidade reduzida
-                    img_buffer = io.BytesIO()
-                    pil_image.save(img_buffer, format="JPEG", quality=image_quality, optimize=True)
-                    img_buffer.seek(0)
-                    
-                    # Substitui a imagem no PDF
-                    doc.update_stream(xref, img_buffer.getvalue())
-                    
-                except Exception as e:
-                    print(f"     ⚠️  Erro ao comprimir imagem {img_index}: {e}")
-                    continue
+            # Só substitui se o novo stream for realmente menor
+            if len(new_bytes) >= info['raw_size']:
+                kept_original += 1
+                continue
+            
+            replace_image_stream(doc, xref, new_bytes, components, info['components'])
+            recompressed += 1
+            if metrics:
+                print_image_metrics(xref, info['width'], info['height'], new_bytes, metrics)
+        
+        skipped = sum(skip_reasons.values())
+        print(f"     🖼️  Imagens: {recompressed} recomprimida(s), {kept_original} mantida(s), {skipped} pulada(s)")
+        if skipped:
+            details = ", ".join(f"{reason}: {count}" for reason, count in skip_reasons.items())
+            print(f"     ⏭️  Puladas ({details})")
+            if work_pixels:
+                saved_time = skipped_pixels * (work_time / work_pixels)
+                print(f"     ⏱️  CPU economizada estimada: {saved_time:.2f}s")
         
-        # Salva o documento comprimido
+        # Salva o documento comprimido (mantém o /ID para saída determinística)
         doc.save(
             output_path,
             garbage=4,
             deflate=True,
             clean=True,
-            pretty=False
+            pretty=False,
+            no_new_id=True
         )
         doc.close()
         return True
@@ -114,6 +366,179 @@ def compress_pdf_aggressive(input_path, output_path, image_quality=60):
         print(f"   ⚠️  Erro na compressão agressiva: {e}")
         return False
 
+# A recompressão seletiva mira um pouco abaixo do limite (a gravação final muda alguns bytes)
+SELECTIVE_TARGET_MARGIN = 0.98
+# Último recurso da recompressão seletiva: resolução efetiva máxima das imagens
+SELECTIVE_DOWNSAMPLE_DPI = 150
+
+def collect_image_infos(doc):
+    """
+    Coleta get_image_info de cada imagem do documento (uma vez por xref)
+    e as páginas em que ela aparece
+    """
+    images = {}
+    for page in doc:
+        for img in page.get_images():
+            xref = img[0]
+            if xref in images:
+                images[xref]['pages'].append(page.number)
+                continue
+            try:
+                info = get_image_info(doc, xref)
+            except Exception as e:
+                print(f"     ⚠️  Erro ao ler imagem {xref}: {e}")
+                continue
+            info['pages'] = [page.number]
+            images[xref] = info
+    return images
+
+def get_image_display_dpi(doc, info):
+    """
+    Resolução efetiva da imagem na página (a menor entre os lugares em que aparece)
+    Retorna None se a imagem não for desenhada diretamente nas páginas
+    """
+    dpi = None
+    for page_number in info['pages']:
+        for rect in doc[page_number].get_image_rects(info['xref']):
+            if rect.width > 0 and rect.height > 0:
+                placement_dpi = min(info['width'] / rect.width, info['height'] / rect.height) * 72
+                dpi = placement_dpi if dpi is None else min(dpi, placement_dpi)
+    return dpi
+
+def plan_image_step(doc, info, image_quality, max_dpi=None):
+    """
+    Decide como recomprimir uma imagem em um nível da recompressão seletiva
+    Retorna (bytes_estimados, dimensões_ou_None) ou None se o nível não reduz a imagem
+    """
+    size = None
+    pixels = info['width'] * info['height']
+    if max_dpi is None:
+        if should_skip_image(info, image_quality):
+            return None
+    else:
+        # Redução de resolução: vale também para JPEGs compactos, mas não para máscaras
+        reason = should_skip_image(info, image_quality)
+        if reason and reason != "JPEG já compacto":
+            return None
+        dpi = get_image_display_dpi(doc, info)
+        if not dpi or dpi <= max_dpi * 1.2:
+            return None
+        scale = max_dpi / dpi
+        size = (max(1, round(info['width'] * scale)), max(1, round(info['height'] * scale)))
+        pixels = size[0] * size[1]
+    
+    estimated = int(expected_jpeg_bpp(image_quality) * pixels / 8)
+    if estimated >= info['raw_size']:
+        return None
+    return estimated, size
+
+def compress_pdf_selective(input_path, output_path, max_size_mb, qualities=(60, 50, 40, 30),
+                           workers=1, downsample_dpi=SELECTIVE_DOWNSAMPLE_DPI, quality_target=None):
+    """
+    Recompressão seletiva: recomprime só as maiores imagens até o PDF caber em max_size_mb
+    As imagens são ordenadas pelo tamanho do stream e recomprimidas em lotes, da maior para
+    a menor, cada lote com a economia estimada que ainda falta; imagens pequenas ficam intactas
+    e o trabalho cresce com o excesso de tamanho, não com o número de imagens
+    As qualidades são tentadas em ordem; se todas forem insuficientes, as imagens acima de
+    downsample_dpi são reduzidas (downsample_dpi=None desativa esse último recurso)
+    Cada imagem é sempre recomprimida a partir do original, sem perdas acumuladas
+    Com quality_target, cada qualidade do nível passa a ser o máximo para a imagem
+    """
+    max_bytes = max_size_mb * 1024 * 1024
+    target = max_bytes * SELECTIVE_TARGET_MARGIN
+    levels = [(quality, None) for quality in qualities]
+    if downsample_dpi:
+        levels.append((qualities[-1], downsample_dpi))
+    # Resultados por (xref, qualidade, dimensões), reaproveitados se for preciso refazer
+    results = {}
+    original_components = {}
+    
+    try:
+        # A estimativa ignora pequenas variações da gravação; se errar, refaz com alvo menor
+        for attempt in range(3):
+            doc = fitz.open(input_path)
+            source = fitz.open(input_path)
+            images = collect_image_infos(doc)
+            current = os.path.getsize(input_path)
+            changed = {}
+            
+            for quality, max_dpi in levels:
+                done = set()
+                while current > target:
+                    # Próximo lote: as maiores imagens até cobrir o excesso estimado
+                    batch = []
+                    estimated_savings = 0
+                    for info in sorted(images.values(), key=lambda item: -item['raw_size']):
+                        if estimated_savings >= current - target:
+                            break
+                        if info['xref'] in done:
+                            continue
+                        step = plan_image_step(doc, info, quality, max_dpi)
+                        if step is None:
+                            continue
+                        batch.append((info, step[1]))
+                        estimated_savings += info['raw_size'] - step[0]
+                    if not batch:
+                        break
+                    
+                    jobs = []
+                    sizes = {}
+                    for info, size in batch:
+                        done.add(info['xref'])
+                        sizes[info['xref']] = size
+                        if (info['xref'], quality, size) not in results:
+                            # Extrai do documento original, não da versão já recomprimida
+                            base_image = source.extract_image(info['xref'])
+                            original_components[info['xref']] = base_image["colorspace"]
+                            jobs.append((info['xref'], base_image["image"], quality, size, quality_target))
+                    for xref, new_bytes, components, metrics, _cpu_time, error in iter_recompressed_images(jobs, workers):
+                        if error:
+                            print(f"     ⚠️  Erro ao comprimir imagem {xref}: {error}")
+                        results[xref, quality, sizes[xref]] = (new_bytes, components, metrics)
+                    
+                    for info, size in batch:
+                        xref = info['xref']
+                        new_bytes, components, metrics = results[xref, quality, size]
+                        # Só substitui se o novo stream for realmente menor que o atual
+                        if not new_bytes or len(new_bytes) >= info['raw_size']:
+                            continue
+                        replace_image_stream(doc, xref, new_bytes, components, original_components[xref], size)
+                        current -= info['raw_size'] - len(new_bytes)
+                        info['raw_size'] = len(new_bytes)
+                        info['filter'] = "/DCTDecode"
+                        if size:
+                            info['width'], info['height'] = size
+                        changed[xref] = (quality, size, metrics)
+                if current <= target:
+                    break
+            
+            # Salva o documento comprimido (mantém o /ID para saída determinística)
+            doc.save(output_path, garbage=4, deflate=True, clean=True, pretty=False, no_new_id=True)
+            doc.close()
+            source.close()
+            
+            final_bytes = os.path.getsize(output_path)
+            if final_bytes <= max_bytes or current > target:
+                break
+            target -= final_bytes - max_bytes + max_bytes * (1 - SELECTIVE_TARGET_MARGIN)
+        
+        downsampled = sum(1 for _quality, size, _metrics in changed.values() if size)
+        print(f"     🖼️  Imagens: {len(changed)} de {len(images)} recomprimida(s) "
+              f"(maiores primeiro), {len(images) - len(changed)} intacta(s)")
+        if changed:
+            lowest = min((metrics or {}).get('quality', quality) for quality, _size, metrics in changed.values())
+            print(f"     📉 Menor qualidade usada: {lowest}%" +
+                  (f", {downsampled} reduzida(s) para {downsample_dpi} dpi" if downsampled else ""))
+        for xref, (quality, size, metrics) in changed.items():
+            if metrics:
+                info = images[xref]
+                print_image_metrics(xref, info['width'], info['height'], results[xref, quality, size][0], metrics)
+        return True
+    
+    except Exception as e:
+        print(f"   ⚠️  Erro na recompressão seletiva: {e}")
+        return False
+
 def optimize_with_pikepdf(input_path, output_path):
     """
     Otimiza o PDF usando pikepdf (versão corrigida)
@@ -131,9 +556,447 @@ def optimize_with_pikepdf(input_path, output_path):
         print(f"   ⚠️  Erro na otimização com pikepdf: {e}")
         return False
 
-def compress_pdf(input_path, output_path, max_size_mb=5.0):
+# Codecs sem perdas que a etapa de imagens sem perdas pode recodificar
+LOSSLESS_IMAGE_CODECS = {"sem filtro", "/FlateDecode", "/LZWDecode", "/RunLengthDecode"}
+
+def get_png_idat(png_bytes):
+    """
+    Extrai os dados IDAT de um PNG: um stream zlib com preditores PNG,
+    que o PDF aceita diretamente como FlateDecode com /Predictor 15
+    """
+    data = []
+    offset = 8  # Assinatura PNG
+    while offset < len(png_bytes):
+        length = int.from_bytes(png_bytes[offset:offset + 4], "big")
+        chunk_type = png_bytes[offset + 4:offset + 8]
+        if chunk_type == b"IDAT":
+            data.append(png_bytes[offset + 8:offset + 8 + length])
+        offset += length + 12
+    return b"".join(data)
+
+def encode_png_flate(pil_image, bits=8):
+    """
+    Codifica a imagem como Flate com preditores PNG (nível máximo de compressão)
+    Retorna (dados, parâmetros de decodificação)
+    """
+    png_buffer = io.BytesIO()
+    options = {'bits': bits} if pil_image.mode == "P" else {}
+    pil_image.save(png_buffer, format="PNG", optimize=True, **options)
+    colors = 3 if pil_image.mode == "RGB" else 1
+    decode_parms = pikepdf.Dictionary(
+        Predictor=15, Colors=colors, BitsPerComponent=bits, Columns=pil_image.width
+    )
+    return get_png_idat(png_buffer.getvalue()), decode_parms
+
+def get_palette_bits(color_count):
+    """Menor profundidade de bits que comporta a quantidade de cores da paleta"""
+    for bits in (1, 2, 4):
+        if color_count <= 2 ** bits:
+            return bits
+    return 8
+
+def get_colorspace_components(colorspace):
+    """
+    Número de componentes do espaço de cores de uma imagem
+    Retorna None para espaços de cores não tratados pela etapa sem perdas
+    """
+    if colorspace in ("/DeviceGray", "/CalGray"):
+        return 1
+    if colorspace in ("/DeviceRGB", "/CalRGB"):
+        return 3
+    if colorspace == "/DeviceCMYK":
+        return 4
+    if isinstance(colorspace, pikepdf.Array) and len(colorspace) >= 2:
+        if colorspace[0] == "/ICCBased":
+            return int(colorspace[1].get("/N", 0)) or None
+        if colorspace[0] == "/Indexed":
+            return 1
+    return None
+
+def encode_image_lossless(image, is_soft_mask=False):
+    """
+    Busca a menor codificação sem perdas de uma imagem do PDF:
+    preditores PNG + Flate no nível máximo, paleta para poucas cores,
+    redução de profundidade de bits e RGB → cinza quando todos os pixels são neutros
+    Retorna (dados, parâmetros, espaço_de_cores, bits) ou None se não houver ganho
+    """
+    colorspace = image.get("/ColorSpace")
+    components = get_colorspace_components(colorspace)
+    width, height = int(image.Width), int(image.Height)
+    if components is None or int(image.get("/BitsPerComponent", 0)) != 8:
+        return None
+    
+    data = image.read_bytes()
+    if len(data) != width * height * components:
+        return None
+    
+    candidates = []
+    is_indexed = isinstance(colorspace, pikepdf.Array) and colorspace[0] == "/Indexed"
+    
+    if components == 4:
+        # CMYK não existe em PNG: só Flate no nível máximo
+        candidates.append((zlib.compress(data, 9), None, colorspace, 8))
+    else:
+        pil_image = Image.frombytes("L" if components == 1 else "RGB", (width, height), data)
+        target_colorspace = colorspace
+        
+        # Imagem RGB sem cor: um único canal basta
+        if components == 3 and colorspace == "/DeviceRGB" and not is_soft_mask:
+            red, green, blue = pil_image.split()
+            if red.tobytes() == green.tobytes() == blue.tobytes():
+                pil_image = red
+                target_colorspace = pikepdf.Name.DeviceGray
+        
+        encoded, decode_parms = encode_png_flate(pil_image)
+        candidates.append((encoded, decode_parms, target_colorspace, 8))
+        
+        if is_indexed:
+            # Paleta existente com poucas cores: só reduz a profundidade de bits
+            bits = get_palette_bits(int(colorspace[2]) + 1)
+            if bits < 8:
+                index_image = pil_image.convert("P")
+                encoded, decode_parms = encode_png_flate(index_image, bits)
+                candidates.append((encoded, decode_parms, colorspace, bits))
+        elif not is_soft_mask:
+            # Poucas cores: converte para paleta (exata) com a menor profundidade de bits
+            colors = pil_image.getcolors(256)
+            if colors:
+                palette_colors = [color for _, color in colors]
+                if pil_image.mode == "L":
+                    lookup = [0] * 256
+                    for index, value in enumerate(palette_colors):
+                        lookup[value] = index
+                    index_image = Image.frombytes("P", (width, height), pil_image.point(lookup).tobytes())
+                    palette_bytes = bytes(palette_colors)
+                else:
+                    palette_bytes = b"".join(bytes(color) for color in palette_colors)
+                    palette_image = Image.new("P", (1, 1))
+                    palette_image.putpalette(palette_bytes)
+                    index_image = pil_image.quantize(palette=palette_image, dither=Image.Dither.NONE)
+                    # A paleta contém todas as cores, mas o mapeamento precisa ser exato
+                    if index_image.convert("RGB").tobytes() != pil_image.tobytes():
+                        index_image = None
+                bits = get_palette_bits(len(palette_colors))
+                if index_image is not None:
+                    encoded, decode_parms = encode_png_flate(index_image, bits)
+                    indexed_colorspace = pikepdf.Array([
+                        pikepdf.Name.Indexed, target_colorspace, len(palette_colors) - 1, palette_bytes
+                    ])
+                    candidates.append((encoded, decode_parms, indexed_colorspace, bits))
+    
+    best = min(candidates, key=lambda candidate: len(candidate[0]))
+    if len(best[0]) >= len(image.read_raw_bytes()):
+        return None
+    return best
+
+def optimize_images_lossless(input_path, output_path):
+    """
+    Recodifica sem perdas as imagens Flate/sem compressão do PDF
+    (screenshots, diagramas, imagens com transparência), preservando máscaras suaves
+    """
+    try:
+        with pikepdf.open(input_path) as pdf:
+            images = [
+                obj for obj in pdf.objects
+                if isinstance(obj, pikepdf.Stream) and obj.get("/Subtype") == "/Image"
+            ]
+            soft_masks = {image.SMask.objgen for image in images if "/SMask" in image}
+            
+            optimized = 0
+            bytes_before = 0
+            bytes_after = 0
+            for image in images:
+                if get_image_codec(image.get("/Filter")) not in LOSSLESS_IMAGE_CODECS:
+                    continue
+                # Máscaras, arrays /Decode e máscaras por cor dependem dos valores originais
+                if image.get("/ImageMask", False) or "/Decode" in image or isinstance(image.get("/Mask"), pikepdf.Array):
+                    continue
+                try:
+                    raw_size = len(image.read_raw_bytes())
+                    result = encode_image_lossless(image, image.objgen in soft_masks)
+                    if result is None:
+                        continue
+                    data, decode_parms, colorspace, bits = result
+                    image.write(data, filter=pikepdf.Name.FlateDecode, decode_parms=decode_parms)
+                    if decode_parms is None and "/DecodeParms" in image:
+                        del image["/DecodeParms"]
+                    image.ColorSpace = colorspace
+                    image.BitsPerComponent = bits
+                    optimized += 1
+                    bytes_before += raw_size
+                    bytes_after += len(data)
+                except Exception as e:
+                    print(f"     ⚠️  Erro na imagem {image.objgen[0]}: {e}")
+            
+            if not optimized:
+                print(f"     ℹ️  Nenhuma imagem sem perdas a otimizar")
+                return False
+            
+            # Mantém os streams recodificados como estão (sem recomprimir o Flate)
+            pdf.save(
+                output_path,
+                compress_streams=True,
+                stream_decode_level=pikepdf.StreamDecodeLevel.none
+            )
+        
+        print(f"     🖼️  {optimized} imagem(ns) sem perdas: {bytes_before / 1024:.0f}KB → {bytes_after / 1024:.0f}KB")
+        return True
+    
+    except Exception as e:
+        print(f"   ⚠️  Erro na otimização sem perdas: {e}")
+        return False
+
+def get_reachable_objects(pdf):
+    """
+    Retorna os identificadores (objgen) de todos os objetos alcançáveis a partir do trailer
+    """
+    reachable = set()
+    stack = [pdf.trailer]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, pikepdf.Stream):
+            children = obj.stream_dict.values()
+        elif isinstance(obj, pikepdf.Dictionary):
+            children = obj.values()
+        elif isinstance(obj, pikepdf.Array):
+            children = obj
+        else:
+            continue
+        for child in children:
+            # Números e booleanos já chegam como tipos nativos do Python
+            if not isinstance(child, pikepdf.Object):
+                continue
+            if child.is_indirect:
+                if child.objgen in reachable:
+                    continue
+                reachable.add(child.objgen)
+            stack.append(child)
+    return reachable
+
+def get_image_codec(filter_value):
+    """Retorna o último filtro de um stream (o codec efetivo da imagem)"""
+    if isinstance(filter_value, pikepdf.Array):
+        filter_value = filter_value[-1] if len(filter_value) else None
+    return str(filter_value) if filter_value is not None else "sem filtro"
+
+def analyze_pdf(input_path):
+    """
+    Analisa o PDF em uma única passada pela tabela de objetos
+    Retorna os bytes por categoria: imagens por codec, fontes, conteúdo,
+    metadados, objetos não usados e outros
+    """
+    try:
+        analysis = {
+            'total_bytes': os.path.getsize(input_path),
+            'images': {},
+            'image_list': [],
+            'fonts': 0,
+            'content': 0,
+            'metadata': 0,
+            'unused': 0,
+            'other': 0,
+            'uncompressed': 0,
+        }
+        
+        with pikepdf.open(input_path) as pdf:
+            reachable = get_reachable_objects(pdf)
+            info = pdf.trailer.get("/Info")
+            info_objgen = info.objgen if info is not None and info.is_indirect else None
+            font_programs = set()
+            content_streams = set()
+            unclassified = {}
+            
+            for obj in pdf.objects:
+                is_stream = isinstance(obj, pikepdf.Stream)
+                if is_stream:
+                    size = len(obj.read_raw_bytes())
+                    dictionary = obj.stream_dict
+                else:
+                    size = len(obj.unparse(resolved=True))
+                    dictionary = obj if isinstance(obj, pikepdf.Dictionary) else None
+                
+                if obj.objgen not in reachable:
+                    analysis['unused'] += size
+                    continue
+                if dictionary is None:
+                    analysis['other'] += size
+                    continue
+                
+                obj_type = dictionary.get("/Type")
+                subtype = dictionary.get("/Subtype")
+                
+                if is_stream and subtype == "/Image":
+                    codec = get_image_codec(dictionary.get("/Filter"))
+                    analysis['images'][codec] = analysis['images'].get(codec, 0) + size
+                    analysis['image_list'].append({
+                        'objgen': obj.objgen,
+                        'width': int(dictionary.get("/Width", 0)),
+                        'height': int(dictionary.get("/Height", 0)),
+                        'filter': codec,
+                        'raw_size': size,
+                        'has_smask': "/SMask" in dictionary,
+                        'has_decode': "/Decode" in dictionary,
+                        'is_mask': bool(dictionary.get("/ImageMask", False)),
+                    })
+                    continue
+                
+                if is_stream and "/Filter" not in dictionary:
+                    analysis['uncompressed'] += size
+                
+                if obj_type == "/Metadata" or subtype == "/XML" or obj.objgen == info_objgen:
+                    analysis['metadata'] += size
+                elif obj_type in ("/Font", "/FontDescriptor"):
+                    for key in ("/FontFile", "/FontFile2", "/FontFile3"):
+                        if key in dictionary:
+                            font_programs.add(dictionary[key].objgen)
+                    analysis['fonts'] += size
+                elif is_stream and subtype == "/Form":
+                    analysis['content'] += size
+                elif is_stream:
+                    # Programas de fonte e conteúdo de página só são reconhecidos por quem os referencia
+                    unclassified[obj.objgen] = size
+                else:
+                    if obj_type == "/Page" and "/Contents" in dictionary:
+                        contents = dictionary["/Contents"]
+                        refs = contents if isinstance(contents, pikepdf.Array) else [contents]
+                        content_streams.update(ref.objgen for ref in refs)
+                    analysis['other'] += size
+            
+            for objgen, size in unclassified.items():
+                if objgen in font_programs:
+                    analysis['fonts'] += size
+                elif objgen in content_streams:
+                    analysis['content'] += size
+                else:
+                    analysis['other'] += size
+        
+        return analysis
+    
+    except Exception as e:
+        print(f"   ⚠️  Erro na análise do PDF: {e}")
+        return None
+
+def print_pdf_analysis(analysis):
+    """
+    Exibe o relatório de composição do PDF gerado por analyze_pdf
+    """
+    total = analysis['total_bytes'] or 1
+    
+    def line(icon, label, size, extra=""):
+        print(f"      {icon} {label}: {size / (1024 * 1024):.2f}MB ({size / total * 100:.1f}%){extra}")
+    
+    print(f"   📊 Composição do PDF ({analysis['total_bytes'] / (1024 * 1024):.2f}MB):")
+    for codec, size in sorted(analysis['images'].items(), key=lambda item: -item[1]):
+        count = sum(1 for image in analysis['image_list'] if image['filter'] == codec)
+        line("🖼️ ", f"Imagens {codec.lstrip('/')}", size, f" - {count} imagem(ns)")
+    line("🔤", "Fontes", analysis['fonts'])
+    line("📝", "Conteúdo", analysis['content'])
+    line("🏷️ ", "Metadados", analysis['metadata'])
+    line("🗑️ ", "Objetos não usados", analysis['unused'])
+    line("📦", "Outros", analysis['other'])
+
+# Fração de cada categoria que as etapas sem perdas costumam eliminar
+STRUCTURE_SAVINGS = {
+    'unused': 1.0,
+    'fonts': 0.8,
+    'uncompressed': 0.7,
+}
+
+def estimate_image_bytes(analysis, image_quality=None):
+    """
+    Estima o total de bytes de imagens após as etapas sem perdas
+    e, se image_quality for informada, após compress_pdf_aggressive nessa qualidade
+    """
+    total = 0
+    for image in analysis['image_list']:
+        size = image['raw_size']
+        if image['filter'] == "sem filtro":
+            size = int(size * (1 - STRUCTURE_SAVINGS['uncompressed']))
+        pixels = image['width'] * image['height']
+        if image_quality is not None and pixels and not should_skip_image(image, image_quality):
+            size = min(size, int(expected_jpeg_bpp(image_quality) * pixels / 8))
+        total += size
+    return total
+
+def plan_compression(analysis, max_size_mb, qualities=(60, 50, 40, 30)):
+    """
+    Escolhe as etapas de compressão a partir da análise do PDF
+    Pula as etapas que não conseguem atingir max_size_mb
+    """
+    max_bytes = max_size_mb * 1024 * 1024
+    image_bytes = sum(analysis['images'].values())
+    lossless_image_bytes = estimate_image_bytes(analysis)
+    structure_savings = sum(analysis[key] * fraction for key, fraction in STRUCTURE_SAVINGS.items())
+    after_structure = analysis['total_bytes'] - structure_savings - (image_bytes - lossless_image_bytes)
+    
+    plan = {
+        'fonts': analysis['fonts'] > 0,
+        'lossless_images': any(codec in LOSSLESS_IMAGE_CODECS for codec in analysis['images']),
+        # A otimização de estrutura só é verificada se puder atingir o limite sozinha
+        'structure': after_structure <= max_bytes,
+        'image_qualities': [qualities[-1]],
+    }
+    
+    # Começa pela primeira qualidade com chance de atingir o limite
+    for index, quality in enumerate(qualities):
+        estimated = after_structure - lossless_image_bytes + estimate_image_bytes(analysis, quality)
+        if estimated <= max_bytes:
+            plan['image_qualities'] = list(qualities[index:])
+            break
+    
+    return plan
+
+def get_page_sizes(input_path):
+    """
+    Retorna o tamanho (bytes) de cada página salva isoladamente
+    Recursos compartilhados contam em todas as páginas que os usam (estimativa conservadora)
+    """
+    sizes = []
+    with fitz.open(input_path) as doc:
+        for page_num in range(len(doc)):
+            single = fitz.open()
+            single.insert_pdf(doc, from_page=page_num, to_page=page_num)
+            sizes.append(len(single.tobytes(garbage=4, deflate=True)))
+            single.close()
+    return sizes
+
+def build_pdf_part(job):
+    """
+    Cria um PDF com um intervalo de páginas (executável em processo separado)
+    Recebe (arquivo_de_origem, primeira_página, última_página, caminho_de_saída)
+    """
+    input_path, first_page, last_page, output_path = job
+    with fitz.open(input_path) as doc:
+        part = fitz.open()
+        part.insert_pdf(doc, from_page=first_page, to_page=last_page)
+        part.save(output_path, garbage=4, deflate=True, clean=True)
+        part.close()
+    return output_path
+
+def split_pdf(input_path, output_path, max_size_mb, workers=None):
+    """
+    Divide o PDF em partes (documento_parte01.pdf, ...) com até max_size_mb cada
+    A divisão é calculada a partir do tamanho de cada página e as partes são criadas em paralelo
+    """
+    page_sizes = get_page_sizes(input_path)
+    
+    def make_job(number, start, end):
+        return (str(input_path), start, end - 1, str(get_part_path(output_path, number)))
+    
+    return write_pdf_parts(page_sizes, max_size_mb * 1024 * 1024, max_size_mb, make_job, build_pdf_part, workers)
+
+def compress_pdf(input_path, output_path, max_size_mb=5.0, workers=1, split=True, split_quality=50, selective=True,
+                 quality_target=None):
     """
     Função principal para comprimir um PDF garantindo tamanho máximo
+    A análise do PDF define quais etapas executar, pulando as que não atingem o limite
+    workers define quantos processos recomprimem as imagens de um mesmo PDF
+    Com selective, só as maiores imagens são recomprimidas (compress_pdf_selective);
+    sem ele, todas as imagens passam por cada qualidade (compress_pdf_aggressive)
+    quality_target (ex.: {'ssim': 0.99} ou {'psnr': 40}) faz cada imagem recomprimida usar
+    a menor qualidade que atinge o alvo, até a qualidade da etapa
+    Se o limite não for atingido e split estiver ativo, o PDF é dividido em partes
+    com imagens na qualidade split_quality em vez de salvar um arquivo acima do limite
     """
     try:
         # Verifica se já está otimizado e dentro do limite
@@ -147,84 +1010,132 @@ def compress_pdf(input_path, output_path, max_size_mb=5.0):
         # Cria arquivo temporário
         temp_path = str(output_path).replace('.pdf', '_temp.pdf')
         temp_path2 = str(output_path).replace('.pdf', '_temp2.pdf')
+        temp_fonts = str(output_path).replace('.pdf', '_temp_fonts.pdf')
+        temp_images = str(output_path).replace('.pdf', '_temp_img.pdf')
+        
+        # Analisa a composição do PDF para escolher as etapas
+        analysis = analyze_pdf(input_path)
+        if analysis:
+            print_pdf_analysis(analysis)
+            plan = plan_compression(analysis, max_size_mb)
+        else:
+            plan = {'fonts': True, 'lossless_images': True, 'structure': True, 'image_qualities': [60, 50, 40, 30]}
+        
+        # Melhor resultado sem perdas obtido até agora (base da compressão agressiva)
+        best_path = str(input_path)
         
         # Passo 1: Compressão conservadora
         print(f"   🗜️  Comprimindo PDF (modo conservador)...")
-        success = False
-        
         if compress_pdf_simple(input_path, temp_path):
-            # Passo 2: Otimiza com pikepdf
+            best_path = temp_path
+            
+            # Passo 2: Otimiza fontes antes de qualquer perda nas imagens
+            if plan['fonts']:
+                print(f"   🔤 Otimizando fontes...")
+                if optimize_fonts(temp_path, temp_fonts):
+                    if get_file_size_mb(temp_fonts) < get_file_size_mb(temp_path):
+                        safe_rename(temp_fonts, temp_path)
+                    else:
+                        os.remove(temp_fonts)
+        
+        # Passo 3: Otimiza com pikepdf
+        if plan['structure'] or best_path == str(input_path):
             print(f"   ⚙️  Otimizando estrutura...")
-            if optimize_with_pikepdf(temp_path, temp_path2):
-                # Verifica se está dentro do limite
-                compressed_size = get_file_size_mb(temp_path2)
-                if compressed_size <= max_size_mb:
-                    print(f"   ✅ Tamanho OK: {compressed_size:.2f}MB ≤ {max_size_mb}MB")
-                    safe_rename(temp_path2, output_path)
-                    success = True
+            if optimize_with_pikepdf(best_path, temp_path2):
+                if best_path == str(input_path) or get_file_size_mb(temp_path2) < get_file_size_mb(best_path):
+                    safe_rename(temp_path2, temp_path)
+                    best_path = temp_path
+        else:
+            print(f"   ⏭️  Otimização de estrutura pulada (não atinge {max_size_mb}MB sozinha)")
+        
+        # Passo 4: Imagens sem perdas (PNG/diagramas/transparência) antes de qualquer perda
+        if plan['lossless_images'] and get_file_size_mb(best_path) > max_size_mb:
+            print(f"   🖼️  Otimizando imagens sem perdas...")
+            if optimize_images_lossless(best_path, temp_path2):
+                if get_file_size_mb(temp_path2) < get_file_size_mb(best_path):
+                    safe_rename(temp_path2, temp_path)
+                    best_path = temp_path
                 else:
-                    print(f"   ⚠️  Ainda muito grande: {compressed_size:.2f}MB > {max_size_mb}MB")
-                    print(f"   🔧 Aplicando compressão agressiva...")
-                    
-                    # Tenta compressão agressiva com diferentes qualidades
-                    for quality in [60, 50, 40, 30]:
-                        print(f"     🎯 Tentando qualidade {quality}%...")
-                        if compress_pdf_aggressive(input_path, temp_path2, quality):
-                            final_size = get_file_size_mb(temp_path2)
-                            if final_size <= max_size_mb:
-                                print(f"     ✅ Sucesso! Tamanho: {final_size:.2f}MB")
-                                safe_rename(temp_path2, output_path)
-                                success = True
-                                break
-                            else:
-                                print(f"     ❌ Ainda grande: {final_size:.2f}MB")
-                    
-                    if not success:
-                        print(f"   ⚠️  Não foi possível reduzir para {max_size_mb}MB")
-                        print(f"   📋 Salvando melhor resultado obtido...")
-                        safe_rename(temp_path2, output_path)
-                        success = True
+                    os.remove(temp_path2)
+        
+        success = False
+        compressed_size = get_file_size_mb(best_path)
+        if compressed_size <= max_size_mb:
+            print(f"   ✅ Tamanho OK: {compressed_size:.2f}MB ≤ {max_size_mb}MB")
+            success = True
+        else:
+            print(f"   ⚠️  Ainda muito grande: {compressed_size:.2f}MB > {max_size_mb}MB")
+            print(f"   🔧 Aplicando compressão agressiva...")
+            
+            with fitz.open(best_path) as doc:
+                page_count = len(doc)
+            can_split = split and page_count > 1
+            
+            qualities = plan['image_qualities']
+            if can_split:
+                # Abaixo da qualidade aceitável é melhor dividir do que degradar
+                qualities = [quality for quality in qualities if quality >= split_quality] or [split_quality]
+            if qualities[0] != 60:
+                print(f"     ⏭️  Qualidades acima de {qualities[0]}% não atingem o limite, pulando")
+            
+            if selective:
+                # Redução de resolução só quando não for possível dividir o PDF
+                downsample_dpi = None if can_split else SELECTIVE_DOWNSAMPLE_DPI
+                attempts = [(
+                    f"recompressão seletiva ({', '.join(f'{quality}%' for quality in qualities)})",
+                    partial(compress_pdf_selective, best_path, temp_images, max_size_mb, qualities, workers,
+                            downsample_dpi, quality_target),
+                )]
             else:
-                # Se pikepdf falhar, usa resultado do PyMuPDF
-                compressed_size = get_file_size_mb(temp_path)
-                if compressed_size <= max_size_mb:
-                    safe_rename(temp_path, output_path)
-                    success = True
-                else:
-                    print(f"   🔧 Aplicando compressão agressiva...")
-                    for quality in [60, 50, 40, 30]:
-                        print(f"     🎯 Tentando qualidade {quality}%...")
-                        if compress_pdf_aggressive(input_path, output_path, quality):
-                            final_size = get_file_size_mb(output_path)
-                            if final_size <= max_size_mb:
-                                print(f"     ✅ Sucesso! Tamanho: {final_size:.2f}MB")
-                                success = True
-                                break
-                            else:
-                                print(f"     ❌ Ainda grande: {final_size:.2f}MB")
-                    
-                    if not success:
-                        print(f"   📋 Salvando melhor resultado obtido...")
+                attempts = [
+                    (f"qualidade {quality}%",
+                     partial(compress_pdf_aggressive, best_path, temp_images, quality, workers, quality_target))
+                    for quality in qualities
+                ]
+            
+            # Tenta compressão agressiva
+            smallest_path = best_path
+            smallest_size = compressed_size
+            for label, attempt in attempts:
+                print(f"     🎯 Tentando {label}...")
+                if attempt():
+                    final_size = get_file_size_mb(temp_images)
+                    if final_size < smallest_size:
+                        safe_rename(temp_images, temp_path2)
+                        smallest_path = temp_path2
+                        smallest_size = final_size
+                    if final_size <= max_size_mb:
+                        print(f"     ✅ Sucesso! Tamanho: {final_size:.2f}MB")
                         success = True
-        else:
-            # Se PyMuPDF falhar, tenta otimização direta
-            print(f"   ⚙️  Tentando otimização direta...")
-            if optimize_with_pikepdf(input_path, temp_path):
-                compressed_size = get_file_size_mb(temp_path)
-                if compressed_size <= max_size_mb:
-                    safe_rename(temp_path, output_path)
-                    success = True
+                        break
+                    else:
+                        print(f"     ❌ Ainda grande: {final_size:.2f}MB")
+            
+            if not success:
+                print(f"   ⚠️  Não foi possível reduzir para {max_size_mb}MB")
+                if can_split:
+                    print(f"   ✂️  Dividindo em partes de até {max_size_mb}MB (qualidade {qualities[-1]}%)...")
+                    remove_pdf_outputs(output_path)
+                    split_pdf(smallest_path, output_path, max_size_mb)
+                    best_path = None
                 else:
-                    print(f"   🔧 Aplicando compressão agressiva...")
-                    for quality in [60, 50, 40, 30]:
-                        if compress_pdf_aggressive(input_path, output_path, quality):
-                            final_size = get_file_size_mb(output_path)
-                            if final_size <= max_size_mb:
-                                success = True
-                                break
+                    print(f"   📋 Salvando melhor resultado obtido...")
+                    best_path = smallest_path
+            else:
+                best_path = smallest_path
+            success = True
+        
+        if best_path is None:
+            pass  # Saída já gravada em partes
+        elif best_path == str(input_path):
+            remove_pdf_outputs(output_path)
+            shutil.copy2(input_path, output_path)
+        else:
+            remove_pdf_outputs(output_path)
+            safe_rename(best_path, output_path)
         
         # Limpa arquivos temporários
-        for temp_file in [temp_path, temp_path2]:
+        for temp_file in [temp_path, temp_path2, temp_fonts, temp_images]:
             if os.path.exists(temp_file):
                 os.remove(temp_file)
         
@@ -290,13 +1201,195 @@ def get_user_size_limit():
             print("\n\n❌ Entrada inválida.")
             sys.exit(0)
 
-def process_pdfs_in_folder(input_folder="entrada", output_folder="saida", max_size_mb=None):
+# Documentos comprimidos ao mesmo tempo no processamento em lote: enquanto um está
+# em uma etapa sequencial (análise, gravação), o outro ocupa os núcleos livres
+PIPELINE_DOCUMENTS = 2
+# Limites de cada documento no processamento em lote: tempo de relógio e memória
+# proporcional (PSS) somada do processo e de seus subprocessos; quem exceder é
+# encerrado e refeito uma vez só com o pikepdf
+JOB_TIME_LIMIT = 600
+JOB_MEMORY_LIMIT_MB = 4096
+# Intervalo entre as verificações dos limites
+JOB_POLL_SECONDS = 0.2
+
+def warm_file_cache(file_path):
+    """Lê o arquivo inteiro só para trazê-lo ao cache do sistema"""
+    try:
+        with open(file_path, 'rb') as f:
+            while f.read(1024 * 1024):
+                pass
+    except OSError as e:
+        print(f"   ⚠️  Erro ao ler {file_path.name}: {e}")
+
+def iter_prefetched_files(file_paths, prefetch=2, metrics=None):
+    """
+    Lê os próximos arquivos em uma thread separada, até prefetch arquivos à frente
+    A leitura só traz o arquivo para o cache do sistema, de modo que a compressão
+    o abre sem esperar pelo disco
+    """
+    for file_path, _ in iter_prefetched(file_paths, warm_file_cache, prefetch, metrics, "leitura → compressão"):
+        yield file_path
+
+def compress_pdf_job(job):
+    """
+    Comprime um PDF em processo separado, guardando as mensagens para exibi-las em ordem
+    Recebe (entrada, saída, tamanho_max, workers, alvo_perceptual_ou_None)
+    e retorna (sucesso, mensagens, segundos)
+    """
+    input_path, output_path, max_size_mb, workers, quality_target = job
+    log = io.StringIO()
+    start_time = time.time()
+    with contextlib.redirect_stdout(log):
+        try:
+            success = compress_pdf(input_path, output_path, max_size_mb, workers, quality_target=quality_target)
+        except Exception as e:
+            print(f"❌ Erro inesperado: {e}")
+            success = False
+    return success, log.getvalue(), time.time() - start_time
+
+def fallback_pdf_job(job):
+    """
+    Estratégia de recuperação: só otimiza a estrutura com o pikepdf, sem abrir com o PyMuPDF
+    Recebe (entrada, saída) e retorna (sucesso, mensagens, segundos)
+    """
+    input_path, output_path = job
+    log = io.StringIO()
+    start_time = time.time()
+    with contextlib.redirect_stdout(log):
+        success = optimize_with_pikepdf(input_path, output_path)
+    return success, log.getvalue(), time.time() - start_time
+
+def run_isolated(connection, target, job):
+    """Executa target(job) no processo isolado e envia o resultado ao processo principal"""
+    # Sessão própria: ao encerrar o trabalho, os subprocessos dele também são encerrados
+    if hasattr(os, "setsid"):
+        os.setsid()
+    connection.send(target(job))
+    connection.close()
+
+def get_process_pss_kb(pid):
+    """
+    Memória proporcional (PSS) de um processo em kB: páginas compartilhadas, como as
+    herdadas do processo pai por cópia na escrita, contam dividido pelo número de donos
+    Retorna None se o processo terminou ou o kernel não tem smaps_rollup
+    """
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "rb") as f:
+            for line in f:
+                if line.startswith(b"Pss:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+def get_session_pss_mb(session_id):
+    """
+    Memória proporcional (PSS) somada dos processos de uma sessão, em MB (lida do /proc)
+    Ao contrário da soma das memórias residentes, não conta duas vezes as páginas
+    que os subprocessos compartilham. Retorna None fora do Linux
+    """
+    if not os.path.isdir("/proc"):
+        return None
+    total_kb = 0
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "rb") as f:
+                # Campos após "(nome)": estado, ppid, pgrp, sessão, ...
+                fields = f.read().rsplit(b")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[3]) == session_id:
+            total_kb += get_process_pss_kb(entry) or 0
+    return total_kb / 1024
+
+class IsolatedJob:
+    """
+    Executa target(job) num processo próprio com limites de tempo e de memória
+    Quem exceder um limite (ou terminar de forma anormal) é encerrado junto com
+    seus subprocessos; failure guarda a causa
+    """
+    
+    def __init__(self, target, job, time_limit=JOB_TIME_LIMIT, memory_limit_mb=JOB_MEMORY_LIMIT_MB):
+        self.time_limit = time_limit
+        self.memory_limit_mb = memory_limit_mb
+        self.result = None
+        self.failure = None
+        self.start_time = time.monotonic()
+        self._connection, child_connection = multiprocessing.Pipe(duplex=False)
+        self.process = multiprocessing.Process(target=run_isolated, args=(child_connection, target, job))
+        self.process.start()
+        child_connection.close()
+    
+    def done(self):
+        """Verifica os limites e retorna se o trabalho terminou (com resultado ou falha)"""
+        if self.result is not None or self.failure is not None:
+            return True
+        if self._receive():
+            return True
+        if not self.process.is_alive():
+            # O processo pode ter enviado o resultado e terminado depois do poll acima
+            self.process.join()
+            if not self._receive():
+                self.failure = f"processo encerrado de forma anormal (código {self.process.exitcode})"
+            return True
+        elapsed = time.monotonic() - self.start_time
+        if self.time_limit and elapsed > self.time_limit:
+            self.kill(f"tempo limite excedido ({elapsed:.1f}s > {self.time_limit}s)")
+            return True
+        pss_mb = get_session_pss_mb(self.process.pid) if self.memory_limit_mb else None
+        if pss_mb and pss_mb > self.memory_limit_mb:
+            self.kill(f"limite de memória excedido ({pss_mb:.0f}MB > {self.memory_limit_mb}MB)")
+            return True
+        return False
+    
+    def _receive(self):
+        """Lê o resultado, se o processo já o enviou; retorna se o trabalho terminou"""
+        if not self._connection.poll():
+            return False
+        try:
+            self.result = self._connection.recv()
+        except EOFError:
+            self.failure = f"processo encerrado de forma anormal (código {self.process.exitcode})"
+        self.process.join()
+        return True
+    
+    def kill(self, cause):
+        """Encerra o processo e seus subprocessos registrando a causa"""
+        self.failure = cause
+        if hasattr(os, "killpg"):
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass  # A sessão ainda não foi criada: encerra só o processo
+        self.process.kill()
+        self.process.join()
+
+def remove_partial_outputs(output_file):
+    """Remove a saída e os temporários deixados por uma compressão encerrada no meio"""
+    output_file = Path(output_file)
+    for partial_file in find_pdf_parts(output_file):
+        partial_file.unlink(missing_ok=True)
+    for temp_file in output_file.parent.glob(f"{output_file.stem}_temp*{output_file.suffix}"):
+        temp_file.unlink(missing_ok=True)
+
+def process_pdfs_in_folder(input_folder="entrada", output_folder="saida", max_size_mb=None, workers=None,
+                           quality_target=None, time_limit=JOB_TIME_LIMIT, memory_limit_mb=JOB_MEMORY_LIMIT_MB):
     """
     Processa todos os PDFs de uma pasta com tamanho máximo personalizável
+    As imagens de cada PDF são recomprimidas em paralelo (workers=None usa todos os núcleos)
+    Os arquivos passam por estágios simultâneos: leitura antecipada → compressão
+    (PIPELINE_DOCUMENTS documentos por vez) → relatório, exibido na ordem original
+    quality_target ativa o modo por qualidade perceptual (ver compress_pdf)
+    Cada documento roda isolado com até time_limit segundos e memory_limit_mb de memória;
+    quem exceder é encerrado, tem a causa registrada e é refeito uma vez só com o pikepdf
     """
     # Se não foi especificado o tamanho, pergunta ao usuário
     if max_size_mb is None:
         max_size_mb = get_user_size_limit()
+    if workers is None:
+        workers = os.cpu_count() or 1
     
     print(f"\n🎯 TAMANHO MÁXIMO CONFIGURADO: {max_size_mb} MB")
     print("=" * 50)
@@ -323,13 +1416,18 @@ def process_pdfs_in_folder(input_folder="entrada", output_folder="saida", max_si
     print(f"📁 Encontrados {len(pdf_files)} arquivo(s) PDF")
     print(f"📤 Saída: '{output_folder}'\n")
     print(f"🎯 OBJETIVO: Todos os arquivos ≤ {max_size_mb}MB\n")
+    if quality_target:
+        target = ", ".join(f"{key.upper()} ≥ {value}" for key, value in quality_target.items())
+        print(f"🔍 Qualidade perceptual mínima das imagens: {target}\n")
     
     total_original_size = 0
     total_compressed_size = 0
     successful_compressions = 0
     files_over_limit = 0
     
-    for i, pdf_file in enumerate(pdf_files, 1):
+    def report_result(i, pdf_file, output_file, success, log, elapsed):
+        """Exibe o resultado de um arquivo (mensagens da compressão incluídas)"""
+        nonlocal total_original_size, total_compressed_size, successful_compressions, files_over_limit
         print(f"[{i}/{len(pdf_files)}] 📄 {pdf_file.name}")
         
         # Tamanho original
@@ -340,17 +1438,13 @@ def process_pdfs_in_folder(input_folder="entrada", output_folder="saida", max_si
         if original_size > max_size_mb:
             files_over_limit += 1
         
-        # Arquivo de saída
-        output_file = output_path / pdf_file.name
+        print(log, end="")
         
-        # Comprime o PDF
-        start_time = time.time()
-        success = compress_pdf(pdf_file, output_file, max_size_mb)
-        end_time = time.time()
-        
-        if success and output_file.exists():
-            # Tamanho comprimido
-            compressed_size = get_file_size_mb(output_file)
+        output_files = find_pdf_parts(output_file)
+        if success and output_files:
+            # Tamanho comprimido (soma das partes, se o PDF foi dividido)
+            compressed_size = sum(get_file_size_mb(part) for part in output_files)
+            largest_size = max(get_file_size_mb(part) for part in output_files)
             total_compressed_size += compressed_size
             
             # Calcula economia
@@ -358,12 +1452,15 @@ def process_pdfs_in_folder(input_folder="entrada", output_folder="saida", max_si
             savings_percent = (savings_mb / original_size) * 100 if original_size > 0 else 0
             
             # Verifica se está dentro do limite
-            status_icon = "✅" if compressed_size <= max_size_mb else "⚠️"
-            limit_status = "DENTRO DO LIMITE" if compressed_size <= max_size_mb else "ACIMA DO LIMITE"
+            status_icon = "✅" if largest_size <= max_size_mb else "⚠️"
+            limit_status = "DENTRO DO LIMITE" if largest_size <= max_size_mb else "ACIMA DO LIMITE"
             
-            print(f"   {status_icon} Comprimido: {compressed_size:.2f} MB ({limit_status})")
+            if len(output_files) > 1:
+                print(f"   {status_icon} Dividido em {len(output_files)} partes: {compressed_size:.2f} MB ({limit_status})")
+            else:
+                print(f"   {status_icon} Comprimido: {compressed_size:.2f} MB ({limit_status})")
             print(f"   💾 Economia: {savings_mb:.2f} MB ({savings_percent:.1f}%)")
-            print(f"   ⏱️  Tempo: {end_time - start_time:.1f}s")
+            print(f"   ⏱️  Tempo: {elapsed:.1f}s")
             successful_compressions += 1
         else:
             print(f"   ❌ Falha na compressão")
@@ -371,6 +1468,80 @@ def process_pdfs_in_folder(input_folder="entrada", output_folder="saida", max_si
         
         print()
     
+    metrics = PipelineMetrics()
+    # Compressões em andamento: [índice, entrada, saída, trabalho isolado, causa da falha]
+    # Um novo documento começa assim que uma das PIPELINE_DOCUMENTS vagas fica livre
+    running = []
+    # Compressões concluídas aguardando as anteriores para o relatório em ordem: índice → entrada
+    finished = {}
+    next_report = 1
+    # Documentos encerrados por limite ou falha do processo: (nome, causa, recuperado)
+    isolation_failures = []
+    
+    def check_running():
+        """
+        Verifica os trabalhos em andamento: os concluídos liberam a vaga e vão para o
+        relatório; quem falhou é refeito (na mesma vaga) com a estratégia de recuperação
+        Retorna se alguma vaga foi liberada
+        """
+        freed = False
+        for entry in list(running):
+            i, pdf_file, output_file, job, cause = entry
+            if not job.done():
+                continue
+            if job.failure and cause is None:
+                entry[4] = job.failure
+                remove_partial_outputs(output_file)
+                entry[3] = IsolatedJob(fallback_pdf_job, (pdf_file, output_file), time_limit, memory_limit_mb)
+                continue
+            running.remove(entry)
+            finished[i] = entry
+            freed = True
+        return freed
+    
+    def report_finished():
+        """Exibe os resultados concluídos cujos anteriores já foram exibidos"""
+        nonlocal next_report
+        while next_report in finished:
+            # Resultados retidos só pela ordem: muitos indicam um documento lento à frente
+            metrics.record("compressão → relatório", len(finished) - 1, PIPELINE_DOCUMENTS)
+            i, pdf_file, output_file, job, cause = finished.pop(next_report)
+            next_report += 1
+            if job.failure:
+                remove_partial_outputs(output_file)
+                success, log, elapsed = False, "", 0.0
+            else:
+                success, log, elapsed = job.result
+            if cause:
+                # Falha do trabalho original: mostra a causa e o resultado da recuperação
+                log = (f"   ⛔ Compressão encerrada: {cause}\n"
+                       f"   🔁 Refeito só com o pikepdf: {'ok' if success else job.failure or 'falhou'}\n" + log)
+                isolation_failures.append((pdf_file.name, cause, success))
+            report_result(i, pdf_file, output_file, success, log, elapsed)
+    
+    try:
+        for i, pdf_file in enumerate(iter_prefetched_files(pdf_files, metrics=metrics), 1):
+            # Arquivo de saída
+            output_file = output_path / pdf_file.name
+            
+            job = (pdf_file, output_file, max_size_mb, workers, quality_target)
+            running.append([i, pdf_file, output_file,
+                            IsolatedJob(compress_pdf_job, job, time_limit, memory_limit_mb), None])
+            # Aguarda uma vaga livre para o próximo documento
+            while len(running) >= PIPELINE_DOCUMENTS and not check_running():
+                time.sleep(JOB_POLL_SECONDS)
+            report_finished()
+        while running:
+            if not check_running():
+                time.sleep(JOB_POLL_SECONDS)
+            report_finished()
+    finally:
+        # Em sessão própria, os trabalhos não recebem o Ctrl+C: encerra os que restarem
+        for _i, _pdf_file, output_file, job, _cause in running:
+            if not job.done():
+                job.kill("processamento interrompido")
+                remove_partial_outputs(output_file)
+    
     # Resumo final
     print("=" * 50)
     print("📊 RESUMO FINAL")
@@ -389,13 +1560,17 @@ def process_pdfs_in_folder(input_folder="entrada", output_folder="saida", max_si
     # Verifica quantos arquivos finais estão dentro do limite
     files_within_limit = 0
     for pdf_file in pdf_files:
-        output_file = output_path / pdf_file.name
-        if output_file.exists():
-            final_size = get_file_size_mb(output_file)
-            if final_size <= max_size_mb:
-                files_within_limit += 1
+        output_files = find_pdf_parts(output_path / pdf_file.name)
+        if output_files and all(get_file_size_mb(part) <= max_size_mb for part in output_files):
+            files_within_limit += 1
     
     print(f"✅ Arquivos finais ≤ {max_size_mb}MB: {files_within_limit}/{len(pdf_files)}")
+    if isolation_failures:
+        print(f"⛔ Compressões encerradas: {len(isolation_failures)}")
+        for name, cause, recovered in isolation_failures:
+            print(f"   • {name}: {cause} → {'recuperado com pikepdf' if recovered else 'sem recuperação'}")
+    print()
+    metrics.report()
     
     print(f"\n🎉 Processo concluído! Arquivos salvos em '{output_folder}'")
 
@@ -415,13 +1590,24 @@ def main():
     try:
         import pikepdf
         import fitz
+        import numpy
         from PIL import Image
     except ImportError as e:
         print("❌ Biblioteca não encontrada!")
-        print("   Execute: pip install pikepdf pymupdf pillow")
+        print("   Execute: pip install pikepdf pymupdf pillow numpy")
         print(f"   Erro: {e}")
         return
     
+    # Modo análise: python compact_pdf.py --analisar arquivo.pdf [...]
+    if len(sys.argv) > 2 and sys.argv[1] == "--analisar":
+        for pdf_file in sys.argv[2:]:
+            print(f"📄 {pdf_file}")
+            analysis = analyze_pdf(pdf_file)
+            if analysis:
+                print_pdf_analysis(analysis)
+            print()
+        return
+    
     # Processa os PDFs
     process_pdfs_in_folder()
 
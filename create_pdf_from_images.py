@@ -7,70 +7,738 @@ Processa pastas de imagens em lote
 """
 
 import os
+import re
 import sys
-from pathlib import Path
+from pathlib import Path, PurePosixPath
 import time
 from PIL import Image
 import io
+import struct
+import tarfile
+import threading
+import zipfile
+import zlib
+import contextlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import fitz  # PyMuPDF
 
-def get_file_size_mb(file_path):
-    """Retorna o tamanho do arquivo em MB"""
-    return os.path.getsize(file_path) / (1024 * 1024)
+from pdf_common import (encode_jpeg, encode_to_quality_target, get_file_size_mb, write_pdf_parts, get_part_path,
+                        find_pdf_parts, remove_pdf_outputs, PipelineMetrics, iter_prefetched)
 
 def get_supported_image_extensions():
     """Retorna extensões de imagem suportadas"""
     return {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif', '.webp'}
 
-def optimize_image_for_pdf(image_path, target_quality=85, max_width=1200):
+def get_supported_archive_extensions():
+    """Retorna extensões de arquivos compactados aceitos como entrada"""
+    return {'.zip', '.tar', '.tgz', '.tar.gz', '.tbz2', '.tar.bz2', '.txz', '.tar.xz'}
+
+def is_archive(path):
+    """Verifica se o caminho é um arquivo ZIP/TAR suportado"""
+    name = path.name.lower()
+    return path.is_file() and any(name.endswith(ext) for ext in get_supported_archive_extensions())
+
+class ArchiveImage:
+    """
+    Imagem dentro de um arquivo ZIP/TAR, lida diretamente sem extração para o disco
+    Expõe name e suffix como um Path para ser usada no lugar do caminho da imagem
+    """
+    
+    def __init__(self, archive_path, member_name):
+        self.archive_path = Path(archive_path)
+        self.member_name = member_name
+        self.name = PurePosixPath(member_name).name
+        self.suffix = PurePosixPath(member_name).suffix
+    
+    def read_bytes(self):
+        return read_archive_member(self.archive_path, self.member_name)
+    
+    def get_size(self):
+        """Tamanho descomprimido do membro, lido do índice do arquivo"""
+        with _archives_lock:
+            _, members = open_archive(self.archive_path)
+            member = members[self.member_name]
+            return member.file_size if isinstance(member, zipfile.ZipInfo) else member.size
+    
+    @contextlib.contextmanager
+    def open(self):
+        """
+        Abre o membro como arquivo com seek, num acesso próprio ao ZIP/TAR
+        (não compartilha o arquivo aberto com outras threads ou processos)
+        """
+        if zipfile.is_zipfile(self.archive_path):
+            with zipfile.ZipFile(self.archive_path) as archive, archive.open(self.member_name) as member:
+                yield member
+        else:
+            with tarfile.open(self.archive_path, 'r:*') as archive, archive.extractfile(self.member_name) as member:
+                yield member
+
+# Arquivos compactados abertos, reaproveitados entre leituras
+_open_archives = {}
+_archives_lock = threading.Lock()
+
+def open_archive(archive_path):
+    """
+    Abre (ou reaproveita) um arquivo ZIP/TAR
+    Retorna o objeto aberto e um índice nome → membro
+    """
+    key = str(archive_path)
+    if key not in _open_archives:
+        if zipfile.is_zipfile(archive_path):
+            archive = zipfile.ZipFile(archive_path)
+            members = {info.filename: info for info in archive.infolist() if not info.is_dir()}
+        else:
+            archive = tarfile.open(archive_path, 'r:*')
+            members = {info.name: info for info in archive.getmembers() if info.isfile()}
+        _open_archives[key] = (archive, members)
+    return _open_archives[key]
+
+def read_archive_member(archive_path, member_name):
+    """Lê os bytes de um membro de um arquivo ZIP/TAR"""
+    with _archives_lock:
+        archive, members = open_archive(archive_path)
+        if isinstance(archive, zipfile.ZipFile):
+            return archive.read(members[member_name])
+        with archive.extractfile(members[member_name]) as member:
+            return member.read()
+
+def is_compressed_tar(archive):
+    """
+    Verifica se o arquivo é um TAR comprimido (.tar.gz, .tar.bz2, ...): nele, voltar
+    a um membro anterior reinicia a descompressão desde o começo do arquivo
+    """
+    # Um TAR sem compressão é lido direto do disco, com seek de custo constante
+    return isinstance(archive, tarfile.TarFile) and not isinstance(archive.fileobj, io.BufferedReader)
+
+def get_archive_read_order(image_paths):
+    """
+    Ordem de leitura das imagens de um TAR comprimido: a ordem dos membros no arquivo,
+    lida numa única passada sequencial. Retorna None se a ordem natural servir
+    (imagens em disco, ZIP, TAR sem compressão ou membros já em ordem)
+    """
+    offsets = []
+    with _archives_lock:
+        for img_path in image_paths:
+            if not isinstance(img_path, ArchiveImage):
+                return None
+            archive, members = open_archive(img_path.archive_path)
+            if not is_compressed_tar(archive):
+                return None
+            offsets.append(members[img_path.member_name].offset_data)
+    order = sorted(range(len(image_paths)), key=offsets.__getitem__)
+    return order if order != sorted(order) else None
+
+def close_archives():
+    """Fecha os arquivos compactados abertos durante o processamento"""
+    with _archives_lock:
+        for archive, _ in _open_archives.values():
+            archive.close()
+        _open_archives.clear()
+
+def find_archive_documents(archive_path, max_depth=1):
+    """
+    Lista os documentos de um arquivo ZIP/TAR
+    Cada diretório de primeiro nível vira um documento com as imagens
+    até max_depth níveis abaixo dele, em ordem natural
+    Membros com caminho absoluto ou com '..' são ignorados (o nome do documento
+    vira o nome do PDF e não pode sair da pasta de saída)
+    """
+    image_extensions = get_supported_image_extensions()
+    _, members = open_archive(archive_path)
+    documents = {}
+    
+    for member_name in members:
+        member_path = PurePosixPath(member_name)
+        parts = member_path.parts
+        if member_path.is_absolute() or ".." in parts:
+            continue
+        if 2 <= len(parts) <= max_depth + 1 and member_path.suffix.lower() in image_extensions:
+            documents.setdefault(parts[0], []).append(ArchiveImage(archive_path, member_name))
+    
+    for images in documents.values():
+        images.sort(key=lambda x: natural_sort_key(x.member_name))
+    return documents
+
+def is_large_image(img_path):
+    """
+    Verifica se a imagem passa de LARGE_IMAGE_PIXELS, sem decodificá-la
+    No disco só o cabeçalho é lido; em ZIP/TAR vale o tamanho descomprimido do membro
+    (ler o cabeçalho e voltar ao início reiniciaria a descompressão de um TAR comprimido)
+    """
+    if isinstance(img_path, ArchiveImage):
+        return img_path.get_size() > LARGE_IMAGE_PIXELS
+    img, _over_limit = open_image(img_path)
+    with img:
+        return img.width * img.height > LARGE_IMAGE_PIXELS
+
+def read_image_data(img_path):
+    """
+    Lê os bytes de uma imagem; retorna None (com aviso) se a leitura falhar
+    Imagens gigantes não são lidas aqui: retorna bytes vazios e o processo de
+    codificação abre o próprio arquivo, lendo-o por faixas
+    """
+    try:
+        if is_large_image(img_path):
+            return b''
+        return img_path.read_bytes()
+    except Exception as e:
+        print(f"     ⚠️  Erro ao ler {img_path.name}: {e}")
+        return None
+
+def iter_image_data(image_paths, prefetch=4, metrics=None):
+    """
+    Lê as imagens em uma thread separada, até prefetch imagens à frente
+    Assim a leitura (disco ou arquivo compactado) se sobrepõe à codificação
+    Gera pares (caminho, bytes); bytes é None se a leitura falhar e vazio
+    para imagens gigantes (lidas depois diretamente do arquivo)
+    Em TAR comprimido, as imagens são lidas na ordem do arquivo e as que chegam
+    adiantadas ficam em memória até a vez delas (ver get_archive_read_order)
+    """
+    read_order = get_archive_read_order(image_paths)
+    if read_order is None:
+        yield from iter_prefetched(image_paths, read_image_data, prefetch, metrics, "leitura → codificação")
+        return
+    
+    read_ahead = {}
+    next_index = 0
+    def load(index):
+        return read_image_data(image_paths[index])
+    
+    for index, img_data in iter_prefetched(read_order, load, prefetch, metrics, "leitura → codificação"):
+        read_ahead[index] = img_data
+        while next_index in read_ahead:
+            yield image_paths[next_index], read_ahead.pop(next_index)
+            next_index += 1
+
+# Resolução usada para converter pixels em pontos quando a imagem não informa a sua
+DEFAULT_PAGE_DPI = 96
+
+def get_image_dpi(img):
+    """
+    Retorna a resolução (dpi horizontal, dpi vertical) informada pela imagem
+    ou None se ausente ou inválida
+    """
+    dpi = img.info.get('dpi')
+    try:
+        if dpi and min(dpi) >= 10:
+            return float(dpi[0]), float(dpi[1])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+# Acima deste número de pixels a imagem não é carregada inteira:
+# é lida e reduzida em faixas horizontais (ex.: digitalizações A0 em 600 dpi)
+LARGE_IMAGE_PIXELS = 40_000_000
+# Memória aproximada de cada faixa lida da imagem original
+IMAGE_BAND_BYTES = 16 * 1024 * 1024
+
+# O limite de segurança do Pillow contra bombas de descompressão é global;
+# a trava impede que duas threads o desativem/restaurem ao mesmo tempo
+_bomb_check_lock = threading.Lock()
+
+def open_image(source):
+    """
+    Abre uma imagem (só o cabeçalho é lido) mantendo a proteção do Pillow
+    contra bombas de descompressão
+    Imagens acima do limite do Pillow são abertas mesmo assim, marcadas como
+    over_limit: só podem seguir se forem lidas por faixas (load_large_image)
+    Retorna (imagem, over_limit)
+    """
+    try:
+        return Image.open(source), False
+    except Image.DecompressionBombError:
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        with _bomb_check_lock:
+            limit = Image.MAX_IMAGE_PIXELS
+            Image.MAX_IMAGE_PIXELS = None
+            try:
+                return Image.open(source), True
+            finally:
+                Image.MAX_IMAGE_PIXELS = limit
+
+# Bits por pixel dos formatos sem compressão que podem ser lidos por faixas
+RAW_MODE_BITS = {'1': 1, 'L': 8, 'P': 8, 'LA': 16, 'RGB': 24, 'BGR': 24, 'RGBA': 32, 'BGRA': 32, 'CMYK': 32}
+
+def iter_raw_bands(img, band_rows):
+    """
+    Lê por faixas uma imagem sem compressão (TIFF, BMP, PPM...)
+    As linhas de cada faixa são lidas diretamente da posição delas no arquivo
+    Retorna um gerador de (linha_inicial, faixa) ou None se o formato não permitir
+    """
+    tiles = []
+    for tile in img.tile:
+        # Desempacotado por posição: tupla simples no Pillow 10, _Tile a partir do 11
+        codec_name, (x0, y0, x1, y1), offset, args = tile[:4]
+        if isinstance(args, str):
+            args = (args,)
+        rawmode, stride, orientation = (tuple(args) + (0, 1))[:3]
+        if codec_name != 'raw' or (x0, x1) != (0, img.width) or orientation not in (1, -1):
+            return None
+        if not stride:
+            if rawmode not in RAW_MODE_BITS:
+                return None
+            stride = (img.width * RAW_MODE_BITS[rawmode] + 7) // 8
+        tiles.append((y0, y1, offset, rawmode, stride, orientation))
+    if not tiles:
+        return None
+    
+    # getpalette() carregaria a imagem inteira; a paleta já lida do cabeçalho basta
+    palette = img.palette if img.mode == 'P' else None
+    
+    def bands():
+        for band_top in range(0, img.height, band_rows):
+            band_bottom = min(band_top + band_rows, img.height)
+            band = Image.new(img.mode, (img.width, band_bottom - band_top))
+            for y0, y1, offset, rawmode, stride, orientation in tiles:
+                top, bottom = max(y0, band_top), min(y1, band_bottom)
+                if top >= bottom:
+                    continue
+                # Imagens de baixo para cima (BMP) guardam as últimas linhas primeiro
+                first_row = top - y0 if orientation == 1 else y1 - bottom
+                img.fp.seek(offset + first_row * stride)
+                data = img.fp.read((bottom - top) * stride)
+                rows = Image.frombytes(img.mode, (img.width, bottom - top), data, 'raw', rawmode, stride, orientation)
+                band.paste(rows, (0, top - band_top))
+            if palette:
+                band.putpalette(palette)
+            yield band_top, band
+    
+    return bands()
+
+def png_chunk(chunk_type, data):
+    """Monta um chunk PNG (tamanho, tipo, dados e CRC)"""
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+def iter_png_bands(img, band_rows):
+    """
+    Lê por faixas um PNG não entrelaçado de 8 bits (ou tons de cinza de 1 bit)
+    Os dados comprimidos são descomprimidos aos poucos e cada faixa é decodificada
+    pelo Pillow como um PNG pequeno, precedido da última linha da faixa anterior
+    (necessária para desfazer os filtros PNG que se referem à linha de cima)
+    Retorna um gerador de (linha_inicial, faixa) ou None se o formato não permitir
+    """
+    fp = img.fp
+    fp.seek(0)
+    if fp.read(8) != b'\x89PNG\r\n\x1a\n':
+        return None
+    
+    header_chunks = []
+    length, chunk_type = struct.unpack(">I4s", fp.read(8))
+    ihdr = fp.read(length)
+    fp.read(4)
+    width, height, bit_depth, color_type, _compression, _filter, interlace = struct.unpack(">IIBBBBB", ihdr)
+    channels = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}.get(color_type)
+    if chunk_type != b'IHDR' or interlace or channels is None:
+        return None
+    if bit_depth != 8 and (bit_depth, color_type) != (1, 0):
+        return None
+    row_bytes = 1 + (width * channels * bit_depth + 7) // 8
+    
+    # Localiza o primeiro IDAT guardando os chunks necessários à decodificação
+    while True:
+        length, chunk_type = struct.unpack(">I4s", fp.read(8))
+        if chunk_type == b'IDAT':
+            break
+        if chunk_type == b'IEND':
+            return None
+        data = fp.read(length)
+        fp.read(4)
+        if chunk_type in (b'PLTE', b'tRNS'):
+            header_chunks.append(png_chunk(chunk_type, data))
+    
+    def iter_filtered_rows():
+        """Gera blocos de até band_rows linhas filtradas (com o byte de filtro)"""
+        nonlocal length, chunk_type
+        decompressor = zlib.decompressobj()
+        pending = bytearray()
+        band_size = band_rows * row_bytes
+        while chunk_type == b'IDAT':
+            data = fp.read(length)
+            fp.read(4)
+            # Descomprime aos poucos para não expandir um IDAT grande de uma vez
+            while data:
+                pending += decompressor.decompress(data, band_size)
+                data = decompressor.unconsumed_tail
+                if len(pending) >= band_size:
+                    yield bytes(pending[:band_size])
+                    del pending[:band_size]
+            length, chunk_type = struct.unpack(">I4s", fp.read(8))
+        pending += decompressor.flush()
+        if pending:
+            yield bytes(pending)
+    
+    def bands():
+        band_top = 0
+        previous_row = b''
+        for filtered in iter_filtered_rows():
+            rows = min(len(filtered) // row_bytes, height - band_top)
+            if rows <= 0:
+                break
+            # A última linha da faixa anterior vai sem filtro (tipo 0), já decodificada
+            extra = 1 if previous_row else 0
+            idat = zlib.compress(b'\x00' * extra + previous_row + filtered[:rows * row_bytes], 0)
+            del filtered
+            ihdr_band = struct.pack(">IIBBBBB", width, rows + extra, bit_depth, color_type, 0, 0, 0)
+            png_file = io.BytesIO()
+            for chunk in (b'\x89PNG\r\n\x1a\n', png_chunk(b'IHDR', ihdr_band), *header_chunks):
+                png_file.write(chunk)
+            png_file.write(png_chunk(b'IDAT', idat))
+            del idat
+            png_file.write(png_chunk(b'IEND', b''))
+            png_file.seek(0)
+            with Image.open(png_file) as band:
+                band.load()
+            del png_file
+            if extra:
+                band = band.crop((0, 1, width, rows + 1))
+            previous_row = band.crop((0, rows - 1, width, rows)).tobytes()
+            yield band_top, band
+            band_top += rows
+    
+    return bands()
+
+def load_large_image(img, width, height):
+    """
+    Reduz uma imagem gigante para (width, height) sem carregá-la inteira na memória
+    JPEG é reduzido na própria decodificação (escala DCT de 1/2, 1/4 ou 1/8);
+    PNG e formatos sem compressão são lidos e reduzidos em faixas horizontais,
+    de modo que o pico de memória depende do tamanho da faixa e não da área da imagem
+    Retorna a imagem reduzida ou None se o formato exigir leitura completa
+    """
+    if img.format == 'JPEG':
+        # A imagem resultante fica um pouco maior que o pedido e o ajuste final é normal
+        img.draft(None, (width, height))
+        img.load()
+        return img
+    
+    band_rows = max(1, IMAGE_BAND_BYTES // (img.width * 4))
+    if img.format == 'PNG':
+        bands = iter_png_bands(img, band_rows)
+    else:
+        bands = iter_raw_bands(img, band_rows)
+    if bands is None:
+        return None
+    
+    # Mesma conversão do caminho normal; imagens de 1 bit viram tons de cinza para
+    # que a redução produza bordas suavizadas em vez de pixels descartados
+    if img.mode == '1':
+        mode = 'L'
+    elif img.mode in ('RGBA', 'LA', 'P'):
+        mode = 'RGB'
+    else:
+        mode = img.mode
+    
+    scale = img.height / height
+    result = Image.new(mode, (width, height))
+    # Linhas do fim da faixa anterior ainda necessárias para a próxima linha de saída
+    carry, carry_top = None, 0
+    out_top = 0
+    for band_top, band in bands:
+        if band.mode != mode:
+            band = band.convert(mode)
+        if carry is not None:
+            joined = Image.new(mode, (band.width, carry.height + band.height))
+            joined.paste(carry, (0, 0))
+            joined.paste(band, (0, carry.height))
+            band, band_top = joined, carry_top
+        band_bottom = band_top + band.height
+        # Só as linhas de saída cuja região de origem já foi lida por completo
+        out_bottom = height if band_bottom >= img.height else min(height, int(band_bottom / scale))
+        if out_bottom > out_top:
+            box = (0, out_top * scale - band_top, band.width, min(band.height, out_bottom * scale - band_top))
+            result.paste(band.resize((width, out_bottom - out_top), Image.Resampling.BOX, box=box), (0, out_top))
+        keep_from = min(band.height, int(out_bottom * scale) - band_top)
+        carry, carry_top = band.crop((0, keep_from, band.width, band.height)), band_top + keep_from
+        out_top = out_bottom
+    return result
+
+@contextlib.contextmanager
+def open_image_source(image_path, image_data=None):
+    """
+    Origem a abrir com o Pillow: os bytes já lidos ou, sem eles, o próprio arquivo
+    Imagens em ZIP/TAR são abertas como arquivo com seek, para a leitura por faixas
+    """
+    if image_data:
+        yield io.BytesIO(image_data)
+    elif isinstance(image_path, ArchiveImage):
+        with image_path.open() as member:
+            yield member
+    else:
+        yield image_path
+
+def optimize_image_for_pdf(image_path, target_quality=85, max_width=1200, image_data=None, quality_target=None):
     """
     Otimiza uma imagem para inclusão em PDF
+    Aceita caminhos no disco ou imagens dentro de arquivos ZIP/TAR (ArchiveImage)
+    image_data permite informar os bytes já lidos da imagem
+    Com quality_target (ex.: {'ssim': 0.95}), target_quality passa a ser a qualidade máxima
     Retorna os bytes da imagem otimizada
     """
+    return optimize_image_with_metrics(image_path, target_quality, max_width, image_data, quality_target)[0]
+
+def optimize_image_with_metrics(image_path, target_quality=85, max_width=1200, image_data=None, quality_target=None):
+    """
+    Igual a optimize_image_for_pdf, mas retorna (bytes, métricas)
+    As métricas (qualidade usada, SSIM, PSNR) só são calculadas com quality_target;
+    sem ele, ou em caso de falha, métricas é None
+    """
     try:
-        with Image.open(image_path) as img:
-            # Converte para RGB se necessário
-            if img.mode in ('RGBA', 'LA', 'P'):
-                img = img.convert('RGB')
-            
-            # Redimensiona se muito grande
-            if img.width > max_width:
-                ratio = max_width / img.width
-                new_height = int(img.height * ratio)
-                img = img.resize((max_width, new_height), Image.Resampling.LANCZOS)
-            
-            # Salva com qualidade especificada
-            img_buffer = io.BytesIO()
-            img.save(img_buffer, format='JPEG', quality=target_quality, optimize=True)
-            img_buffer.seek(0)
-            
-            return img_buffer.getvalue()
+        with open_image_source(image_path, image_data) as source:
+            img, over_limit = open_image(source)
+            with img:
+                # Resolução original, usada para manter o tamanho físico da página
+                dpi = get_image_dpi(img)
+                original_width = img.width
+                
+                # Imagens gigantes são reduzidas sem carregá-las inteiras
+                reduced = None
+                if img.width > max_width and img.width * img.height > LARGE_IMAGE_PIXELS:
+                    reduced = load_large_image(img, max_width, int(img.height * max_width / img.width))
+                if reduced is not None:
+                    img = reduced
+                elif over_limit:
+                    # Acima do limite do Pillow, a leitura completa seria uma bomba de descompressão
+                    raise Image.DecompressionBombError(
+                        f"{img.width}x{img.height} pixels acima do limite do Pillow "
+                        f"({Image.MAX_IMAGE_PIXELS}) e formato sem leitura por faixas")
+                
+                # Converte para RGB se necessário
+                if img.mode in ('RGBA', 'LA', 'P'):
+                    img = img.convert('RGB')
+                
+                # Redimensiona se muito grande
+                if img.width > max_width:
+                    new_height = int(img.height * max_width / img.width)
+                    img = img.resize((max_width, new_height), Image.Resampling.LANCZOS)
+                
+                # A resolução acompanha a redução para manter o tamanho físico
+                if dpi and img.width != original_width:
+                    ratio = img.width / original_width
+                    dpi = (dpi[0] * ratio, dpi[1] * ratio)
+                
+                save_options = {'optimize': True}
+                if dpi:
+                    save_options['dpi'] = (round(dpi[0]), round(dpi[1]))
+                
+                # Menor qualidade que atinge o alvo perceptual ou a qualidade especificada
+                if quality_target:
+                    return encode_to_quality_target(img, target_quality, quality_target, save_options)
+                return encode_jpeg(img, target_quality, save_options), None
     
     except Exception as e:
         print(f"     ⚠️  Erro ao otimizar {image_path.name}: {e}")
-        return None
+        return None, None
+
+def print_quality_metrics(encoded, quality_target):
+    """Exibe, por imagem, a qualidade escolhida e as métricas perceptuais obtidas"""
+    for img_path, img_bytes, metrics in encoded:
+        if metrics is None:
+            continue
+        status_icon = "🔍" if metrics['met'] else "⚠️ "
+        print(f"     {status_icon} {img_path.name}: qualidade {metrics['quality']}%, "
+              f"SSIM {metrics['ssim']:.3f}, PSNR {metrics['psnr']:.1f}dB, {len(img_bytes) / 1024:.0f}KB")
+    missed = sum(1 for *_page, metrics in encoded if metrics is not None and not metrics['met'])
+    if missed:
+        target = ", ".join(f"{key.upper()} ≥ {value}" for key, value in quality_target.items())
+        print(f"     ⚠️  {missed} imagem(ns) abaixo do alvo ({target}) na qualidade máxima permitida")
+
+def optimize_image_job(job):
+    """
+    Otimiza uma imagem já lida (executável em processo separado)
+    Recebe (caminho, bytes, qualidade, largura_max, alvo_perceptual) e retorna (bytes, métricas)
+    """
+    img_path, img_data, quality, max_width, quality_target = job
+    return optimize_image_with_metrics(img_path, quality, max_width, img_data, quality_target)
+
+def encode_images(image_paths, quality=85, max_width=1200, pipeline=None, quality_target=None):
+    """
+    Lê e otimiza as imagens, retornando (caminho, bytes, métricas) de cada página
+    (falhas são ignoradas); com pipeline, a codificação é distribuída entre os processos dele
+    """
+    if pipeline is not None:
+        encoded = pipeline.iter_optimized_images(image_paths, quality, max_width, quality_target)
+    else:
+        encoded = (
+            (img_path, *(optimize_image_with_metrics(img_path, quality, max_width, img_data, quality_target)
+                         if img_data is not None else (None, None)))
+            for img_path, img_data in iter_image_data(image_paths)
+        )
+    return [(img_path, img_bytes, metrics) for img_path, img_bytes, metrics in encoded if img_bytes]
+
+def estimate_encoded_size(pages):
+    """Estima o tamanho do PDF (MB) a partir das páginas já codificadas"""
+    total_size = sum(len(img_bytes) for img_bytes in pages)
+    
+    # Adiciona overhead do PDF (aproximadamente 10-20%)
+    pdf_overhead = total_size * 0.15
+    return (total_size + pdf_overhead) / (1024 * 1024)
 
 def estimate_pdf_size(image_paths, quality=85, max_width=1200):
     """
     Estima o tamanho do PDF baseado nas imagens
     """
-    total_size = 0
+    pages = [img_bytes for _img_path, img_bytes, _metrics in encode_images(image_paths, quality, max_width)]
+    return estimate_encoded_size(pages)
+
+def add_image_page(doc, img_bytes):
+    """
+    Adiciona ao documento uma página do tamanho da imagem já otimizada
+    O stream JPEG é embutido diretamente, sem criar um documento temporário por página
+    """
+    # Só o cabeçalho é lido para obter dimensões e resolução
+    with Image.open(io.BytesIO(img_bytes)) as img:
+        width_px, height_px = img.size
+        dpi_x, dpi_y = get_image_dpi(img) or (DEFAULT_PAGE_DPI, DEFAULT_PAGE_DPI)
     
-    for img_path in image_paths:
-        img_bytes = optimize_image_for_pdf(img_path, quality, max_width)
-        if img_bytes:
-            total_size += len(img_bytes)
+    # Cria uma página com o tamanho da imagem (em pontos)
+    page = doc.new_page(width=width_px * 72 / dpi_x, height=height_px * 72 / dpi_y)
     
-    # Adiciona overhead do PDF (aproximadamente 10-20%)
-    pdf_overhead = total_size * 0.15
-    estimated_size_mb = (total_size + pdf_overhead) / (1024 * 1024)
+    # Insere a imagem ocupando a página inteira
+    page.insert_image(page.rect, stream=img_bytes)
+
+def build_pdf_part(job):
+    """
+    Cria um PDF a partir de imagens já otimizadas (executável em processo separado)
+    Recebe (lista_de_bytes_das_imagens, caminho_de_saída) e retorna o caminho
+    """
+    pages, output_path = job
+    doc = fitz.open()
+    for img_bytes in pages:
+        add_image_page(doc, img_bytes)
+    doc.save(output_path, garbage=4, deflate=True, clean=True)
+    doc.close()
+    return output_path
+
+class ImagePipeline:
+    """
+    Pipeline em estágios para o processamento em lote:
+    leitura antecipada (thread) → codificação (processos) → gravação (processo)
+    O disco e os núcleos trabalham ao mesmo tempo: enquanto um PDF é gravado,
+    as imagens do próximo documento já são lidas e codificadas
+    As filas entre os estágios são limitadas e a profundidade delas fica em metrics
+    """
+    
+    def __init__(self, workers=None, prefetch=4, max_pending_writes=2):
+        self.workers = workers or os.cpu_count() or 1
+        self.prefetch = prefetch
+        self.max_pending_writes = max_pending_writes
+        self.metrics = PipelineMetrics()
+        self.encoder = ProcessPoolExecutor(max_workers=self.workers)
+        self.writer = ProcessPoolExecutor(max_workers=1)
+        # Gravações em andamento, em ordem: [caminho, future, callbacks]
+        self.pending_writes = deque()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def iter_optimized_images(self, image_paths, quality, max_width, quality_target=None):
+        """
+        Estágio de codificação: até 2 imagens por processo ficam em codificação
+        Gera (caminho, bytes otimizados, métricas) na ordem original; bytes é None em caso de falha
+        """
+        capacity = 2 * self.workers
+        in_flight = deque()
+        for img_path, img_data in iter_image_data(image_paths, self.prefetch, self.metrics):
+            future = None
+            if img_data is not None:
+                job = (img_path, img_data, quality, max_width, quality_target)
+                future = self.encoder.submit(optimize_image_job, job)
+            in_flight.append((img_path, future))
+            if len(in_flight) >= capacity:
+                yield self._take_encoded(in_flight, capacity)
+        while in_flight:
+            yield self._take_encoded(in_flight, capacity)
+    
+    def _take_encoded(self, in_flight, capacity):
+        """Retorna a imagem mais antiga em codificação, registrando quantas já estão prontas"""
+        ready = sum(1 for _img_path, future in in_flight if future is None or future.done())
+        self.metrics.record("codificação → montagem", ready, capacity)
+        img_path, future = in_flight.popleft()
+        return (img_path, *(future.result() if future is not None else (None, None)))
+    
+    def write_pdf(self, pages, output_path):
+        """
+        Estágio de gravação: monta e salva o PDF em segundo plano
+        Bloqueia apenas se já houver max_pending_writes gravações pendentes
+        """
+        self.collect_writes()
+        self.metrics.record("montagem → gravação", len(self.pending_writes), self.max_pending_writes)
+        while len(self.pending_writes) >= self.max_pending_writes:
+            self._finish_write()
+        future = self.writer.submit(build_pdf_part, (pages, str(output_path)))
+        self.pending_writes.append([Path(output_path), future, []])
+    
+    def after_write(self, output_path, callback):
+        """
+        Chama callback(sucesso) quando output_path estiver gravado
+        Se não houver gravação pendente para ele, chama imediatamente
+        """
+        for pending_path, _future, callbacks in self.pending_writes:
+            if pending_path == Path(output_path):
+                callbacks.append(callback)
+                return
+        callback(True)
     
-    return estimated_size_mb
+    def collect_writes(self, wait=False):
+        """Finaliza as gravações concluídas (ou todas, com wait=True), em ordem"""
+        while self.pending_writes and (wait or self.pending_writes[0][1].done()):
+            self._finish_write()
+    
+    def _finish_write(self):
+        output_path, future, callbacks = self.pending_writes.popleft()
+        try:
+            future.result()
+            print(f"     📦 PDF gravado: {output_path.name} ({get_file_size_mb(output_path):.2f}MB)")
+            success = True
+        except Exception as e:
+            print(f"     ❌ Erro ao gravar {output_path.name}: {e}")
+            success = False
+        for callback in callbacks:
+            callback(success)
+    
+    def close(self):
+        """Aguarda as gravações pendentes e encerra os processos"""
+        try:
+            self.collect_writes(wait=True)
+        finally:
+            self.encoder.shutdown()
+            self.writer.shutdown()
 
-def create_pdf_from_images(image_paths, output_path, max_size_mb=5.0):
+def create_pdf_parts(encoded_pages, output_path, config, max_size_mb, workers=None):
+    """
+    Divide as imagens já codificadas com config em vários PDFs, cada um com até max_size_mb
+    A divisão é calculada a partir do tamanho de cada imagem codificada
+    e as partes são criadas em paralelo
+    """
+    print(f"     ✂️  Dividindo em partes de até {max_size_mb}MB "
+          f"(qualidade {config['quality']}%, largura max {config['max_width']}px)")
+    
+    page_sizes = [len(img_bytes) for img_bytes in encoded_pages]
+    
+    def make_job(number, start, end):
+        return (encoded_pages[start:end], str(get_part_path(output_path, number)))
+    
+    # Mesmo overhead considerado em estimate_pdf_size
+    write_pdf_parts(page_sizes, max_size_mb * 1024 * 1024 / 1.15, max_size_mb, make_job, build_pdf_part, workers)
+    return True
+
+def create_pdf_from_images(image_paths, output_path, max_size_mb=5.0, split=True, min_split_quality=55,
+                           pipeline=None, quality_target=None):
     """
     Cria um PDF a partir de uma lista de imagens
     Ajusta automaticamente a qualidade para não ultrapassar max_size_mb
+    Se nem a qualidade mínima aceitável (min_split_quality) couber e split estiver ativo,
+    divide o documento em partes (documento_parte01.pdf, ...) em vez de degradar as imagens
+    Com quality_target (ex.: {'ssim': 0.95} ou {'psnr': 38}), cada imagem usa a menor
+    qualidade que atinge o alvo, limitada pela qualidade de cada configuração testada
+    Com pipeline (ImagePipeline), a codificação é paralela e o PDF único é gravado em
+    segundo plano: use pipeline.after_write para saber quando ele estiver pronto
     """
     if not image_paths:
         return False
@@ -88,47 +756,54 @@ def create_pdf_from_images(image_paths, output_path, max_size_mb=5.0):
         {'quality': 35, 'max_width': 700},
         {'quality': 25, 'max_width': 600},
     ]
+    if split and len(image_paths) > 1:
+        # Abaixo da qualidade aceitável é melhor dividir do que degradar
+        configs = [config for config in configs if config['quality'] >= min_split_quality] or configs[:1]
     
     best_config = None
     
-    # Encontra a melhor configuração
+    # Encontra a melhor configuração; as páginas codificadas no teste são as usadas no PDF
+    quality_label = "qualidade até" if quality_target else "qualidade"
     for config in configs:
-        estimated_size = estimate_pdf_size(image_paths, config['quality'], config['max_width'])
-        print(f"     🎯 Testando qualidade {config['quality']}%, largura max {config['max_width']}px: ~{estimated_size:.2f}MB")
+        encoded = encode_images(image_paths, config['quality'], config['max_width'], pipeline, quality_target)
+        pages = [img_bytes for _img_path, img_bytes, _metrics in encoded]
+        estimated_size = estimate_encoded_size(pages)
+        print(f"     🎯 Testando {quality_label} {config['quality']}%, largura max {config['max_width']}px: ~{estimated_size:.2f}MB")
         
         if estimated_size <= max_size_mb:
             best_config = config
             break
     
+    remove_pdf_outputs(output_path)
+    if quality_target:
+        print_quality_metrics(encoded, quality_target)
+    
+    if not best_config and split and len(image_paths) > 1:
+        try:
+            workers = pipeline.workers if pipeline is not None else None
+            return create_pdf_parts(pages, output_path, configs[-1], max_size_mb, workers)
+        except Exception as e:
+            print(f"     ❌ Erro ao dividir o PDF: {e}")
+            return False
+    
     if not best_config:
         print(f"     ⚠️  Usando configuração mínima (pode exceder {max_size_mb}MB)")
         best_config = configs[-1]
     else:
-        print(f"     ✅ Configuração escolhida: qualidade {best_config['quality']}%, largura max {best_config['max_width']}px")
+        print(f"     ✅ Configuração escolhida: {quality_label} {best_config['quality']}%, largura max {best_config['max_width']}px")
+    
+    if not pages:
+        print(f"     ❌ Nenhuma imagem pôde ser otimizada")
+        return False
+    
+    # Cria o PDF (as páginas da configuração escolhida já estão codificadas)
+    print(f"     📄 Montando PDF com {len(pages)} página(s)")
+    if pipeline is not None:
+        pipeline.write_pdf(pages, output_path)
+        return True
     
-    # Cria o PDF
     try:
-        doc = fitz.open()  # Novo documento PDF
-        
-        for i, img_path in enumerate(image_paths):
-            print(f"     📄 Adicionando página {i+1}/{len(image_paths)}: {img_path.name}")
-            
-            # Otimiza a imagem
-            img_bytes = optimize_image_for_pdf(img_path, best_config['quality'], best_config['max_width'])
-            if not img_bytes:
-                continue
-            
-            # Cria uma nova página
-            img_doc = fitz.open("pdf", img_bytes)
-            page_ref = img_doc[0]
-            
-            # Adiciona a página ao documento principal
-            doc.insert_pdf(img_doc)
-            img_doc.close()
-        
-        # Salva o PDF
-        doc.save(output_path, garbage=4, deflate=True, clean=True)
-        doc.close()
+        build_pdf_part((pages, str(output_path)))
         
         # Verifica o tamanho final
         final_size = get_file_size_mb(output_path)
@@ -140,10 +815,70 @@ def create_pdf_from_images(image_paths, output_path, max_size_mb=5.0):
         print(f"     ❌ Erro ao criar PDF: {e}")
         return False
 
-def process_image_folders(input_folder="imagens", output_folder="pdfs_gerados"):
+def natural_sort_key(name):
+    """
+    Chave de ordenação natural: 'img2' vem antes de 'img10'
+    Caminhos são comparados pasta por pasta
+    """
+    return [
+        [int(token) if token.isdigit() else token.lower() for token in re.split(r'(\d+)', part)]
+        for part in re.split(r'[\\/]', str(name))
+    ]
+
+def scan_folder_images(folder, max_depth=1):
+    """
+    Gera as imagens de uma pasta usando os.scandir, sem montar listas intermediárias
+    Desce até max_depth níveis de subpastas (1 = só a própria pasta)
+    """
+    image_extensions = get_supported_image_extensions()
+    try:
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.is_file() and os.path.splitext(entry.name)[1].lower() in image_extensions:
+                    yield Path(entry.path)
+                elif max_depth > 1 and entry.is_dir():
+                    yield from scan_folder_images(entry.path, max_depth - 1)
+    except OSError as e:
+        print(f"⚠️  Erro ao ler a pasta '{folder}': {e}")
+
+def find_folder_images(folder, max_depth=1):
+    """
+    Retorna as imagens de uma pasta (até max_depth níveis), em ordem natural
+    """
+    images = list(scan_folder_images(folder, max_depth))
+    images.sort(key=lambda x: natural_sort_key(x.relative_to(folder)))
+    return images
+
+def iter_image_jobs(input_path, max_depth=1):
+    """
+    Gera os documentos a processar conforme a pasta de entrada é varrida
+    Cada subpasta (ou diretório de primeiro nível de um ZIP/TAR) vira um documento
+    Gera pares (nome_do_documento, imagens); o processamento começa antes do fim da varredura
+    """
+    with os.scandir(input_path) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                images = find_folder_images(Path(entry.path), max_depth)
+                if images:
+                    yield entry.name, images
+            elif is_archive(Path(entry.path)):
+                # Arquivos ZIP/TAR são lidos diretamente, sem extração
+                try:
+                    documents = find_archive_documents(entry.path, max_depth)
+                except Exception as e:
+                    print(f"⚠️  Erro ao ler o arquivo '{entry.name}': {e}")
+                    continue
+                for document_name, images in sorted(documents.items()):
+                    yield document_name, images
+
+def process_image_folders(input_folder="imagens", output_folder="pdfs_gerados", max_depth=1, workers=None,
+                          quality_target=None):
     """
     Processa pastas de imagens e cria PDFs
     Cada subpasta vira um PDF separado
+    max_depth define quantos níveis de subpastas entram em cada documento
+    A leitura, a codificação (workers processos) e a gravação rodam em estágios simultâneos
+    quality_target ativa o modo por qualidade perceptual (ver create_pdf_from_images)
     """
     input_path = Path(input_folder)
     output_path = Path(output_folder)
@@ -162,66 +897,69 @@ def process_image_folders(input_folder="imagens", output_folder="pdfs_gerados"):
         print(f"   1. Coloque suas imagens em subpastas dentro de '{input_folder}'")
         print(f"   2. Cada subpasta será convertida em um PDF separado")
         print(f"   3. Exemplo: '{input_folder}/documento1/' → 'documento1.pdf'")
-        print(f"   4. Execute o script novamente")
+        print(f"   4. Arquivos ZIP/TAR também são aceitos (cada pasta interna vira um PDF)")
+        print(f"   5. Execute o script novamente")
         return
     
     output_path.mkdir(exist_ok=True)
     
-    # Busca por subpastas com imagens
     image_extensions = get_supported_image_extensions()
-    folders_with_images = []
-    
-    for subfolder in input_path.iterdir():
-        if subfolder.is_dir():
-            images = []
-            for file in subfolder.iterdir():
-                if file.suffix.lower() in image_extensions:
-                    images.append(file)
-            
-            if images:
-                # Ordena as imagens por nome
-                images.sort(key=lambda x: x.name.lower())
-                folders_with_images.append((subfolder, images))
-    
-    if not folders_with_images:
-        print(f"❌ Nenhuma pasta com imagens encontrada em '{input_folder}'!")
-        print(f"   📋 Formatos suportados: {', '.join(image_extensions)}")
-        return
     
-    print(f"📁 Encontradas {len(folders_with_images)} pasta(s) com imagens")
     print(f"📤 Saída: '{output_folder}'\n")
     print(f"🎯 OBJETIVO: Todos os PDFs ≤ 5.0MB\n")
     
-    total_folders = len(folders_with_images)
+    total_folders = 0
     successful_pdfs = 0
     total_images = 0
+    # PDF de saída de cada documento (as partes são encontradas com find_pdf_parts)
+    output_files = []
     
-    for i, (folder, images) in enumerate(folders_with_images, 1):
-        print(f"[{i}/{total_folders}] 📂 {folder.name}")
-        print(f"   📸 {len(images)} imagem(ns) encontrada(s)")
-        total_images += len(images)
-        
-        # Nome do PDF de saída
-        pdf_name = f"{folder.name}.pdf"
-        output_file = output_path / pdf_name
-        
-        # Cria o PDF
-        start_time = time.time()
-        success = create_pdf_from_images(images, output_file)
-        end_time = time.time()
-        
-        if success and output_file.exists():
-            final_size = get_file_size_mb(output_file)
+    def report_result(folder_name, output_file, start_time, written):
+        """Exibe o resultado de um documento quando a gravação dele termina"""
+        nonlocal successful_pdfs
+        output_files = find_pdf_parts(output_file)
+        if written and output_files:
+            final_size = max(get_file_size_mb(pdf_file) for pdf_file in output_files)
             status_icon = "✅" if final_size <= 5.0 else "⚠️"
             limit_status = "DENTRO DO LIMITE" if final_size <= 5.0 else "ACIMA DO LIMITE"
             
-            print(f"   {status_icon} PDF criado: {final_size:.2f} MB ({limit_status})")
-            print(f"   ⏱️  Tempo: {end_time - start_time:.1f}s")
+            if len(output_files) > 1:
+                print(f"   {status_icon} {folder_name}: PDF dividido em {len(output_files)} partes de até {final_size:.2f} MB ({limit_status})")
+            else:
+                print(f"   {status_icon} {folder_name}: PDF criado: {final_size:.2f} MB ({limit_status})")
+            print(f"   ⏱️  Tempo: {time.time() - start_time:.1f}s")
             successful_pdfs += 1
         else:
-            print(f"   ❌ Falha na criação do PDF")
-        
-        print()
+            print(f"   ❌ {folder_name}: Falha na criação do PDF")
+    
+    with ImagePipeline(workers) as pipeline:
+        # As pastas são processadas conforme são encontradas
+        for i, (folder_name, images) in enumerate(iter_image_jobs(input_path, max_depth), 1):
+            total_folders = i
+            print(f"[{i}] 📂 {folder_name}")
+            print(f"   📸 {len(images)} imagem(ns) encontrada(s)")
+            total_images += len(images)
+            
+            # Nome do PDF de saída
+            pdf_name = f"{folder_name}.pdf"
+            output_file = output_path / pdf_name
+            output_files.append(output_file)
+            
+            # Cria o PDF; a gravação segue em segundo plano enquanto a próxima pasta é lida
+            start_time = time.time()
+            if create_pdf_from_images(images, output_file, pipeline=pipeline, quality_target=quality_target):
+                pipeline.after_write(output_file, partial(report_result, folder_name, output_file, start_time))
+            else:
+                report_result(folder_name, output_file, start_time, False)
+            
+            print()
+    
+    close_archives()
+    
+    if not total_folders:
+        print(f"❌ Nenhuma pasta com imagens encontrada em '{input_folder}'!")
+        print(f"   📋 Formatos suportados: {', '.join(image_extensions)}")
+        return
     
     # Resumo final
     print("=" * 50)
@@ -230,24 +968,29 @@ def process_image_folders(input_folder="imagens", output_folder="pdfs_gerados"):
     print(f"✅ PDFs criados com sucesso: {successful_pdfs}/{total_folders}")
     print(f"📸 Total de imagens processadas: {total_images}")
     
-    # Verifica quantos PDFs estão dentro do limite
+    # Verifica quantos documentos (PDF único ou todas as partes) estão dentro do limite
     pdfs_within_limit = 0
     total_size = 0
     
-    for pdf_file in output_path.glob("*.pdf"):
-        size = get_file_size_mb(pdf_file)
-        total_size += size
-        if size <= 5.0:
+    for output_file in output_files:
+        part_sizes = [get_file_size_mb(pdf_file) for pdf_file in find_pdf_parts(output_file)]
+        total_size += sum(part_sizes)
+        if part_sizes and max(part_sizes) <= 5.0:
             pdfs_within_limit += 1
     
     print(f"🎯 PDFs dentro do limite (≤ 5MB): {pdfs_within_limit}/{successful_pdfs}")
     print(f"📦 Tamanho total dos PDFs: {total_size:.2f} MB")
+    print()
+    pipeline.metrics.report()
     
     print(f"\n🎉 Processo concluído! PDFs salvos em '{output_folder}'")
 
-def process_single_folder_images(input_folder="imagens_unico_pdf", output_file="documento_completo.pdf"):
+def process_single_folder_images(input_folder="imagens_unico_pdf", output_file="documento_completo.pdf", max_depth=1,
+                                 quality_target=None):
     """
     Cria um único PDF com todas as imagens de uma pasta
+    max_depth define quantos níveis de subpastas são incluídos
+    quality_target ativa o modo por qualidade perceptual (ver create_pdf_from_images)
     """
     input_path = Path(input_folder)
     
@@ -258,39 +1001,37 @@ def process_single_folder_images(input_folder="imagens_unico_pdf", output_file="
         print(f"   ✅ Pasta criada! Coloque suas imagens em '{input_folder}' e execute novamente.")
         return
     
-    # Busca por imagens
+    # Busca por imagens (em ordem natural)
     image_extensions = get_supported_image_extensions()
-    images = []
-    
-    for file in input_path.iterdir():
-        if file.suffix.lower() in image_extensions:
-            images.append(file)
+    images = find_folder_images(input_path, max_depth)
     
     if not images:
         print(f"❌ Nenhuma imagem encontrada em '{input_folder}'!")
         print(f"   📋 Formatos suportados: {', '.join(image_extensions)}")
         return
     
-    # Ordena as imagens por nome
-    images.sort(key=lambda x: x.name.lower())
-    
     print(f"📸 Encontradas {len(images)} imagem(ns)")
     print(f"📤 Criando: {output_file}")
     print(f"🎯 OBJETIVO: PDF ≤ 5.0MB\n")
     
-    # Cria o PDF
+    # Cria o PDF (a codificação das imagens é distribuída entre os núcleos)
     start_time = time.time()
-    success = create_pdf_from_images(images, output_file)
+    with ImagePipeline() as pipeline:
+        success = create_pdf_from_images(images, output_file, pipeline=pipeline, quality_target=quality_target)
     end_time = time.time()
     
-    if success and Path(output_file).exists():
-        final_size = get_file_size_mb(output_file)
+    output_files = find_pdf_parts(output_file)
+    if success and output_files:
+        final_size = max(get_file_size_mb(pdf_file) for pdf_file in output_files)
         status_icon = "✅" if final_size <= 5.0 else "⚠️"
         limit_status = "DENTRO DO LIMITE" if final_size <= 5.0 else "ACIMA DO LIMITE"
         
-        print(f"\n{status_icon} PDF criado: {final_size:.2f} MB ({limit_status})")
+        if len(output_files) > 1:
+            print(f"\n{status_icon} PDF dividido em {len(output_files)} partes de até {final_size:.2f} MB ({limit_status})")
+        else:
+            print(f"\n{status_icon} PDF criado: {final_size:.2f} MB ({limit_status})")
         print(f"⏱️  Tempo total: {end_time - start_time:.1f}s")
-        print(f"🎉 Arquivo salvo: {output_file}")
+        print(f"🎉 Arquivo(s) salvo(s): {', '.join(str(pdf_file) for pdf_file in output_files)}")
     else:
         print(f"\n❌ Falha na criação do PDF")
 
@@ -308,10 +1049,11 @@ def main():
     # Verifica se as bibliotecas estão instaladas
     try:
         import fitz
+        import numpy
         from PIL import Image
     except ImportError as e:
         print("❌ Biblioteca não encontrada!")
-        print("   Execute: pip install pymupdf pillow")
+        print("   Execute: pip install pymupdf pillow numpy")
         print(f"   Erro: {e}")
         return
     
@@ -12,6 +12,8 @@ from PIL import Image
 import io
 import fitz  # PyMuPDF
 
+from create_pdf_from_images import add_image_page, get_image_dpi
+
 def get_file_size_mb(file_path):
     """Retorna o tamanho do arquivo em MB"""
     return os.path.getsize(file_path) / (1024 * 1024)
@@ -27,6 +29,9 @@ def optimize_image_for_pdf(image_path, target_quality=85, max_width=1200):
     """
     try:
         with Image.open(image_path) as img:
+            # Resolução original, usada para manter o tamanho físico da página
+            dpi = get_image_dpi(img)
+            
             # Converte para RGB se necessário
             if img.mode in ('RGBA', 'LA', 'P'):
                 img = img.convert('RGB')
@@ -36,10 +41,15 @@ def optimize_image_for_pdf(image_path, target_quality=85, max_width=1200):
                 ratio = max_width / img.width
                 new_height = int(img.height * ratio)
                 img = img.resize((max_width, new_height), Image.Resampling.LANCZOS)
+                if dpi:
+                    dpi = (dpi[0] * ratio, dpi[1] * ratio)
             
             # Salva com qualidade especificada
+            save_options = {'quality': target_quality, 'optimize': True}
+            if dpi:
+                save_options['dpi'] = (round(dpi[0]), round(dpi[1]))
             img_buffer = io.BytesIO()
-            img.save(img_buffer, format='JPEG', quality=target_quality, optimize=True)
+            img.save(img_buffer, format='JPEG', **save_options)
             img_buffer.seek(0)
             
             return img_buffer.getvalue()
@@ -116,12 +126,7 @@ def create_pdf_from_images(image_paths, output_path, max_size_mb=5.0):
             if not img_bytes:
                 continue
             
-            # Cria uma página com a imagem
-            img_rect = fitz.Rect(0, 0, 595, 842)  # A4 size
-            page = doc.new_page(width=img_rect.width, height=img_rect.height)
-            
-            # Insere a imagem na página
-            page.insert_image(img_rect, stream=img_bytes)
+            add_image_page(doc, img_bytes)
         
         # Salva o PDF
         doc.save(output_path, garbage=4, deflate=True, clean=True)
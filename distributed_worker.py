@@ -0,0 +1,478 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Modo distribuído de processamento em lote
+Vários processos (na mesma máquina ou em máquinas diferentes) apontados para as
+mesmas pastas de entrada e saída num sistema de arquivos compartilhado dividem o
+trabalho entre si, sem servidor central:
+- cada trabalho é reservado criando atomicamente um arquivo de reserva (O_EXCL)
+- quem reservou renova a reserva periodicamente (batimento)
+- reservas sem batimento por mais que o prazo são retomadas por outro processo
+- a saída é gerada numa pasta temporária e publicada com um rename atômico,
+  então cada trabalho produz exatamente uma saída, mesmo com retomadas
+"""
+
+import os
+import re
+import time
+import uuid
+import shutil
+import socket
+import argparse
+import threading
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+import create_pdf_from_images as images_tool
+import compact_pdf as pdf_tool
+
+# Pasta (dentro de cada pasta de saída) com as reservas e as saídas em preparo
+LEASES_FOLDER = ".reservas"
+# Segundos sem batimento até uma reserva ser considerada abandonada
+LEASE_SECONDS = 120.0
+# Arquivo que identifica quem publicou uma saída (mantém a pasta de conclusão não vazia)
+OWNER_FILE = ".dono"
+
+LEASE_NAME = re.compile(r"^(?P<key>.+)\.(?P<generation>\d+)\.lease$")
+PART_NAME = re.compile(r"^(?P<stem>.+)_parte\d+$")
+
+def make_owner_id():
+    """Identificador único deste processo (máquina, PID e sufixo aleatório)"""
+    host = socket.gethostname().replace(".", "-")
+    return f"{host}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+class Lease:
+    """
+    Reserva de um trabalho, renovada por uma thread de batimento
+    lost indica que a reserva foi retomada por outro processo
+    """
+
+    def __init__(self, leases, key, generation, path):
+        self.leases = leases
+        self.key = key
+        self.generation = generation
+        self.path = path
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._heartbeat, daemon=True)
+        self._thread.start()
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.leases.lease_seconds / 4):
+            try:
+                os.utime(self.path)
+            except FileNotFoundError:
+                self.lost.set()
+            # Retomar a reserva cria a geração seguinte
+            if self.leases.lease_path(self.key, self.generation + 1).exists():
+                self.lost.set()
+            if self.lost.is_set():
+                return
+
+    def release(self):
+        """Encerra o batimento e remove o arquivo de reserva"""
+        self._stop.set()
+        self._thread.join()
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+class LeaseDirectory:
+    """
+    Reservas e publicação das saídas de uma pasta de saída compartilhada
+    Para cada trabalho (chave), usa os arquivos:
+    - <chave>.<geração>.lease: reserva; retomar uma reserva cria a geração seguinte
+    - <chave>.<dono>.tmp/: saída em preparo
+    - <chave>.done/: saída publicada (os arquivos são movidos para a pasta de saída)
+    - <chave>.failed: falha registrada (não é tentada novamente)
+    """
+
+    def __init__(self, output_folder, owner, lease_seconds=LEASE_SECONDS):
+        self.output_folder = Path(output_folder)
+        self.path = self.output_folder / LEASES_FOLDER
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        # Última marca de batimento vista em cada reserva: (chave, geração) → (mtime, instante local)
+        # O prazo é medido pelo relógio local, então relógios dessincronizados entre máquinas não importam
+        self._observed = {}
+        # Estado lido na última varredura da pasta de reservas (ver scan)
+        self.finished = set()
+        self.generations = {}
+        self.stagings = {}
+        self.scanned_at = None
+
+    def setup(self):
+        self.output_folder.mkdir(exist_ok=True)
+        self.path.mkdir(exist_ok=True)
+
+    def scan(self):
+        """
+        Lê o estado de todas as reservas com uma única listagem da pasta:
+        trabalhos concluídos, geração mais recente de cada reserva e saídas em preparo
+        """
+        self.finished = set()
+        self.generations = {}
+        self.stagings = {}
+        for name in os.listdir(self.path):
+            base, _, suffix = name.rpartition(".")
+            if suffix in ("done", "failed"):
+                self.finished.add(base)
+            elif suffix == "tmp":
+                # <chave>.<dono>.tmp (o dono não tem pontos)
+                self.stagings.setdefault(base.rpartition(".")[0], []).append(name)
+            elif (match := LEASE_NAME.match(name)):
+                key, generation = match['key'], int(match['generation'])
+                self.generations[key] = max(generation, self.generations.get(key, generation))
+        self.scanned_at = time.monotonic()
+
+    def is_scan_stale(self):
+        """
+        A varredura vale por até lease_seconds: nesse intervalo uma reserva vista
+        (ou criada depois) pode ser retomada no máximo uma vez
+        """
+        return self.scanned_at is None or time.monotonic() - self.scanned_at >= self.lease_seconds
+
+    def current_generation(self, key):
+        """
+        Geração atual da reserva a partir da última varredura, sem listar a pasta
+        Basta verificar a geração vista e a seguinte (ver is_scan_stale)
+        """
+        known = self.generations.get(key)
+        start = 0 if known is None else known
+        for generation in (start + 1, start):
+            if self.lease_path(key, generation).exists():
+                return generation
+        return known
+
+    def lease_path(self, key, generation):
+        return self.path / f"{key}.{generation}.lease"
+
+    def is_finished(self, key):
+        """Verifica se o trabalho já foi publicado ou teve a falha registrada"""
+        return (self.path / f"{key}.done").exists() or (self.path / f"{key}.failed").exists()
+
+    def is_expired(self, key, generation):
+        """Verifica se a reserva está sem batimento há pelo menos lease_seconds"""
+        now = time.monotonic()
+        try:
+            beat = self.lease_path(key, generation).stat().st_mtime_ns
+        except FileNotFoundError:
+            return True
+        seen = self._observed.get((key, generation))
+        if seen is None or seen[0] != beat:
+            self._observed[key, generation] = (beat, now)
+            return False
+        return now - seen[1] >= self.lease_seconds
+
+    def try_claim(self, key):
+        """
+        Tenta reservar o trabalho (livre ou com reserva abandonada)
+        Retorna a Lease ou None se o trabalho já terminou ou está reservado
+        """
+        if self.is_finished(key):
+            return None
+        generation = self.current_generation(key)
+        if generation is not None and not self.is_expired(key, generation):
+            return None
+        new_generation = 0 if generation is None else generation + 1
+        path = self.lease_path(key, new_generation)
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return None
+        with os.fdopen(fd, "w") as lease_file:
+            lease_file.write(f"{self.owner}\n")
+        lease = Lease(self, key, new_generation, path)
+
+        # Outro processo pode ter publicado entre a verificação e a reserva
+        if self.is_finished(key):
+            lease.release()
+            return None
+
+        # Limpa a geração anterior e as saídas em preparo de donos anteriores
+        if generation is not None:
+            self.lease_path(key, generation).unlink(missing_ok=True)
+        for staging_name in self.stagings.pop(key, []):
+            shutil.rmtree(self.path / staging_name, ignore_errors=True)
+        self.generations[key] = new_generation
+        return lease
+
+    def staging_folder(self, key):
+        """Cria a pasta temporária em que este processo gera a saída do trabalho"""
+        staging = self.path / f"{key}.{self.owner}.tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir()
+        return staging
+
+    def commit(self, key, staging):
+        """
+        Publica a saída de forma atômica (rename da pasta temporária para <chave>.done)
+        Só um processo consegue publicar cada trabalho; retorna se este publicou
+        """
+        (staging / OWNER_FILE).write_text(f"{self.owner}\n")
+        try:
+            # Falha se <chave>.done já existe (nunca está vazia por causa do OWNER_FILE)
+            os.rename(staging, self.path / f"{key}.done")
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+            return False
+        self.publish(self.path / f"{key}.done")
+        return True
+
+    def publish(self, done_folder):
+        """Move os arquivos de uma saída publicada para a pasta de saída (pode ser repetido)"""
+        for output_file in sorted(done_folder.iterdir()):
+            if output_file.name != OWNER_FILE:
+                try:
+                    os.replace(output_file, self.output_folder / output_file.name)
+                except FileNotFoundError:
+                    pass  # Movido por outro processo que também concluía a publicação
+
+    def finish_publications(self):
+        """
+        Conclui publicações interrompidas (processo encerrado no meio da movimentação)
+        Usa os trabalhos concluídos da última varredura
+        """
+        for key in self.finished:
+            done_folder = self.path / f"{key}.done"
+            if done_folder.is_dir() and any(entry.name != OWNER_FILE for entry in done_folder.iterdir()):
+                self.publish(done_folder)
+
+    def record_failure(self, key, message):
+        """Registra a falha do trabalho (só o primeiro registro é mantido)"""
+        try:
+            fd = os.open(self.path / f"{key}.failed", os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return
+        with os.fdopen(fd, "w") as failed_file:
+            failed_file.write(f"{self.owner}\n{message}\n")
+
+def list_output_stems(output_folder):
+    """
+    Nomes (sem extensão) dos documentos com PDF na pasta de saída, com uma única
+    listagem: documento.pdf e documento_parteNN.pdf contam como documento
+    """
+    stems = set()
+    for name in os.listdir(output_folder):
+        stem, extension = os.path.splitext(name)
+        if extension == ".pdf":
+            stems.add(stem)
+            match = PART_NAME.match(stem)
+            if match:
+                stems.add(match['stem'])
+    return stems
+
+class DistributedWorker:
+    """
+    Processo de trabalho do modo distribuído
+    Varre as pastas de entrada, reserva os trabalhos livres (ou abandonados),
+    processa e publica; termina quando todos os trabalhos foram concluídos
+    """
+
+    def __init__(self, images_folder="imagens", images_output="pdfs_gerados",
+                 pdfs_folder="entrada", pdfs_output="saida", max_size_mb=5.0,
+                 lease_seconds=LEASE_SECONDS, workers=None, quality_target=None):
+        self.images_folder = Path(images_folder)
+        self.pdfs_folder = Path(pdfs_folder)
+        self.max_size_mb = max_size_mb
+        self.workers = workers or os.cpu_count() or 1
+        self.quality_target = quality_target
+        self.owner = make_owner_id()
+        self.image_leases = LeaseDirectory(images_output, self.owner, lease_seconds)
+        self.pdf_leases = LeaseDirectory(pdfs_output, self.owner, lease_seconds)
+        # Espera entre varreduras quando todo o trabalho restante está reservado por outros
+        self.poll_seconds = min(2.0, lease_seconds / 4)
+        # Documentos de cada arquivo ZIP/TAR: caminho → ((mtime, tamanho), nomes)
+        # Evita reler o índice (um TAR comprimido inteiro) a cada varredura
+        self._archive_documents = {}
+
+    def list_jobs(self):
+        """
+        Lista os trabalhos pendentes das pastas de entrada: (chave, tipo, origem, reservas)
+        Cada pasta (entrada, saída e reservas) é listada uma única vez; trabalhos
+        concluídos ou com saída já existente (de execuções anteriores) são ignorados
+        """
+        for leases in (self.image_leases, self.pdf_leases):
+            leases.scan()
+        jobs = []
+        if self.images_folder.exists():
+            image_outputs = list_output_stems(self.image_leases.output_folder)
+            for entry in sorted(self.images_folder.iterdir()):
+                if entry.is_dir():
+                    if entry.name not in image_outputs:
+                        jobs.append((f"pasta-{entry.name}", "folder", entry, self.image_leases))
+                elif images_tool.is_archive(entry):
+                    key = f"arquivo-{entry.name}"
+                    # Concluídos já saem da lista: o índice deles nem precisa ser lido
+                    if key not in self.image_leases.finished and not self.archive_has_output(entry, image_outputs):
+                        jobs.append((key, "archive", entry, self.image_leases))
+        if self.pdfs_folder.exists():
+            pdf_outputs = list_output_stems(self.pdf_leases.output_folder)
+            for pdf_file in sorted(self.pdfs_folder.glob("*.pdf")):
+                if pdf_file.stem not in pdf_outputs:
+                    # Chave sem ".pdf": compress_pdf deriva os temporários substituindo ".pdf" no caminho
+                    jobs.append((f"pdf-{pdf_file.stem}", "pdf", pdf_file, self.pdf_leases))
+        return [job for job in jobs if job[0] not in job[3].finished]
+
+    def archive_has_output(self, archive, output_stems):
+        """
+        Verifica se todos os documentos de um arquivo ZIP/TAR já têm PDF gerado
+        (output_stems vem de list_output_stems)
+        """
+        try:
+            stat = archive.stat()
+            version = (stat.st_mtime_ns, stat.st_size)
+            cached = self._archive_documents.get(archive)
+            if cached is None or cached[0] != version:
+                try:
+                    documents = images_tool.find_archive_documents(archive)
+                finally:
+                    images_tool.close_archives()
+                names = {name for name, images in documents.items() if images}
+                cached = self._archive_documents[archive] = (version, names)
+        except Exception:
+            return False  # O erro de leitura é informado ao processar o arquivo
+        return cached[1] <= output_stems
+
+    def run_job(self, kind, source, staging):
+        """Processa um trabalho gerando a saída em staging; retorna se teve sucesso"""
+        if kind == "pdf":
+            return pdf_tool.compress_pdf(source, staging / source.name, self.max_size_mb, self.workers,
+                                         quality_target=self.quality_target)
+        if kind == "folder":
+            documents = {source.name: images_tool.find_folder_images(source)}
+        else:
+            documents = images_tool.find_archive_documents(source)
+        try:
+            success = True
+            for document_name, images in sorted(documents.items()):
+                if images:
+                    success &= images_tool.create_pdf_from_images(images, staging / f"{document_name}.pdf",
+                                                                  self.max_size_mb,
+                                                                  quality_target=self.quality_target)
+            return success
+        finally:
+            images_tool.close_archives()
+
+    def process(self, key, kind, source, leases, lease):
+        """Processa um trabalho reservado e publica (ou registra a falha)"""
+        print(f"🔒 [{self.owner}] {source.name} (reserva {lease.generation})")
+        start_time = time.time()
+        staging = leases.staging_folder(key)
+        try:
+            success = self.run_job(kind, source, staging)
+        except Exception as e:
+            print(f"   ❌ Erro inesperado: {e}")
+            success = False
+
+        try:
+            if lease.lost.is_set():
+                # Outro processo retomou o trabalho: a saída dele é a que vale
+                shutil.rmtree(staging, ignore_errors=True)
+                print(f"   ⚠️  Reserva perdida, resultado descartado: {source.name}")
+            elif not success:
+                shutil.rmtree(staging, ignore_errors=True)
+                leases.record_failure(key, "falha no processamento")
+                print(f"   ❌ Falha registrada: {source.name}")
+            elif leases.commit(key, staging):
+                print(f"   ✅ Publicado em {time.time() - start_time:.1f}s: {source.name}")
+            else:
+                print(f"   ⚠️  Já publicado por outro processo: {source.name}")
+        finally:
+            lease.release()
+        print()
+
+    def run(self):
+        """
+        Laço principal: reserva e processa trabalhos até não restar nenhum
+        Retorna o número de trabalhos processados por este processo
+        """
+        for leases in (self.image_leases, self.pdf_leases):
+            leases.setup()
+            leases.scan()
+            leases.finish_publications()
+
+        processed = 0
+        while True:
+            # Uma varredura por passada; a lista só é refeita quando acaba
+            # (ou quando a varredura fica velha demais para decidir as reservas)
+            pending = self.list_jobs()
+            if not pending:
+                for leases in (self.image_leases, self.pdf_leases):
+                    leases.finish_publications()
+                return processed
+            claimed = stale = False
+            for key, kind, source, leases in pending:
+                if leases.is_scan_stale():
+                    stale = True
+                    break
+                lease = leases.try_claim(key)
+                if lease:
+                    self.process(key, kind, source, leases, lease)
+                    processed += 1
+                    claimed = True
+            if not claimed and not stale:
+                # Todo o trabalho restante está reservado: aguarda conclusão ou abandono
+                time.sleep(self.poll_seconds)
+                for leases in (self.image_leases, self.pdf_leases):
+                    leases.finish_publications()
+
+def run_worker(options):
+    """Executa um processo de trabalho (alvo dos processos locais de --processos)"""
+    worker = DistributedWorker(**options)
+    processed = worker.run()
+    print(f"🏁 [{worker.owner}] {processed} trabalho(s) processado(s)")
+    return processed
+
+def main():
+    """Função principal"""
+    parser = argparse.ArgumentParser(
+        description="Processa as pastas de entrada em conjunto com outros processos/máquinas "
+                    "que usam as mesmas pastas (sistema de arquivos compartilhado)")
+    parser.add_argument("--tamanho-max", type=float, default=5.0, help="tamanho máximo dos PDFs em MB")
+    parser.add_argument("--prazo", type=float, default=LEASE_SECONDS,
+                        help="segundos sem batimento até uma reserva ser retomada por outro processo")
+    parser.add_argument("--processos", type=int, default=1,
+                        help="processos de trabalho a iniciar nesta máquina (útil para testes locais)")
+    parser.add_argument("--imagens", default="imagens", help="pasta com as subpastas de imagens")
+    parser.add_argument("--pdfs-gerados", default="pdfs_gerados", help="pasta de saída dos PDFs de imagens")
+    parser.add_argument("--entrada", default="entrada", help="pasta com os PDFs a comprimir")
+    parser.add_argument("--saida", default="saida", help="pasta de saída dos PDFs comprimidos")
+    parser.add_argument("--ssim-min", type=float,
+                        help="SSIM mínimo de cada imagem (ex.: 0.95); usa a menor qualidade que o atinge")
+    parser.add_argument("--psnr-min", type=float, help="PSNR mínimo de cada imagem em dB (ex.: 38)")
+    args = parser.parse_args()
+    quality_target = {key: value for key, value in (("ssim", args.ssim_min), ("psnr", args.psnr_min))
+                      if value is not None} or None
+
+    print("🌐 MODO DISTRIBUÍDO")
+    print("=" * 35)
+    print(f"📋 Imagens: '{args.imagens}' → '{args.pdfs_gerados}'")
+    print(f"📋 PDFs: '{args.entrada}' → '{args.saida}'")
+    print(f"📋 LIMITE MÁXIMO: {args.tamanho_max}MB")
+    print(f"📋 Prazo das reservas: {args.prazo:.0f}s")
+    print()
+
+    processes = max(1, args.processos)
+    options = {
+        'images_folder': args.imagens, 'images_output': args.pdfs_gerados,
+        'pdfs_folder': args.entrada, 'pdfs_output': args.saida,
+        'max_size_mb': args.tamanho_max, 'lease_seconds': args.prazo,
+        # Os núcleos da máquina são divididos entre os processos locais
+        'workers': max(1, (os.cpu_count() or 1) // processes),
+        'quality_target': quality_target,
+    }
+
+    try:
+        if processes == 1:
+            run_worker(options)
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                total = sum(executor.map(run_worker, [options] * processes))
+            print(f"\n🏁 Total: {total} trabalho(s) processado(s) por {processes} processo(s)")
+    except KeyboardInterrupt:
+        print("\n\n👋 Processamento interrompido (as reservas expiram e serão retomadas).")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Funções compartilhadas por create_pdf_from_images e compact_pdf
+"""
+
+import io
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from PIL import Image
+import numpy as np
+
+# Modo por qualidade perceptual: a comparação é feita em tons de cinza numa versão
+# reduzida das imagens (lado maior com até COMPARE_SIZE pixels); reduções maiores
+# escondem os artefatos do JPEG e tornam qualquer qualidade aceitável
+COMPARE_SIZE = 1024
+# Janela (em pixels da versão reduzida) usada no cálculo do SSIM
+SSIM_WINDOW = 8
+# Menor qualidade JPEG testada e intervalo entre as qualidades testadas
+TARGET_MIN_QUALITY = 20
+TARGET_QUALITY_STEP = 5
+
+def get_comparison_luma(img):
+    """Versão reduzida em tons de cinza (array float) usada nas métricas de qualidade"""
+    scale = COMPARE_SIZE / max(img.size)
+    if scale < 1:
+        img = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), Image.Resampling.BOX)
+    return np.asarray(img.convert('L'), dtype=np.float64)
+
+def window_mean(values, window):
+    """Média de cada janela window x window (tabela de somas acumuladas, sem laços)"""
+    sums = np.pad(values, ((1, 0), (1, 0))).cumsum(axis=0).cumsum(axis=1)
+    total = sums[window:, window:] - sums[:-window, window:] - sums[window:, :-window] + sums[:-window, :-window]
+    return total / (window * window)
+
+def compare_luma(reference, candidate):
+    """
+    Compara duas imagens em tons de cinza de mesmo tamanho
+    Retorna (SSIM médio das janelas SSIM_WINDOW x SSIM_WINDOW, PSNR em dB)
+    """
+    mse = np.mean((reference - candidate) ** 2)
+    psnr = float('inf') if mse == 0 else float(10 * np.log10(255 ** 2 / mse))
+    
+    window = min(SSIM_WINDOW, *reference.shape)
+    mean_x = window_mean(reference, window)
+    mean_y = window_mean(candidate, window)
+    var_x = window_mean(reference * reference, window) - mean_x ** 2
+    var_y = window_mean(candidate * candidate, window) - mean_y ** 2
+    covariance = window_mean(reference * candidate, window) - mean_x * mean_y
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    ssim_map = ((2 * mean_x * mean_y + c1) * (2 * covariance + c2)) / \
+               ((mean_x ** 2 + mean_y ** 2 + c1) * (var_x + var_y + c2))
+    return float(ssim_map.mean()), psnr
+
+def meets_quality_target(metrics, quality_target):
+    """Verifica se as métricas atingem os mínimos de quality_target ('ssim' e/ou 'psnr')"""
+    return all(metrics[key] >= minimum for key, minimum in quality_target.items())
+
+def encode_jpeg(img, quality, save_options=None):
+    """Codifica a imagem como JPEG na qualidade informada (save_options vai para img.save)"""
+    img_buffer = io.BytesIO()
+    img.save(img_buffer, format='JPEG', quality=quality, **(save_options or {'optimize': True}))
+    return img_buffer.getvalue()
+
+def encode_to_quality_target(img, max_quality, quality_target, save_options=None):
+    """
+    Codifica a imagem na menor qualidade JPEG (até max_quality) que atinge quality_target
+    As qualidades são testadas por busca binária; se nenhuma atingir o alvo, usa max_quality
+    Retorna (bytes, métricas) com métricas = {'quality', 'ssim', 'psnr', 'met'}
+    """
+    reference = get_comparison_luma(img)
+    candidates = list(range(TARGET_MIN_QUALITY, max_quality, TARGET_QUALITY_STEP)) + [max_quality]
+    results = {}
+    
+    def evaluate(quality):
+        if quality not in results:
+            data = encode_jpeg(img, quality, save_options)
+            with Image.open(io.BytesIO(data)) as decoded:
+                ssim, psnr = compare_luma(reference, get_comparison_luma(decoded))
+            metrics = {'quality': quality, 'ssim': ssim, 'psnr': psnr}
+            metrics['met'] = meets_quality_target(metrics, quality_target)
+            results[quality] = (data, metrics)
+        return results[quality]
+    
+    low, high = 0, len(candidates) - 1
+    best = max_quality
+    while low <= high:
+        middle = (low + high) // 2
+        if evaluate(candidates[middle])[1]['met']:
+            best = candidates[middle]
+            high = middle - 1
+        else:
+            low = middle + 1
+    return evaluate(best)
+
+def get_file_size_mb(file_path):
+    """Retorna o tamanho do arquivo em MB"""
+    return os.path.getsize(file_path) / (1024 * 1024)
+
+def partition_pages_by_size(page_sizes, max_bytes):
+    """
+    Divide as páginas, em ordem, no menor número de partes com até max_bytes cada
+    Retorna uma lista de intervalos (início, fim); uma página maior que o limite fica sozinha
+    """
+    parts = []
+    start = 0
+    current = 0
+    for index, size in enumerate(page_sizes):
+        if index > start and current + size > max_bytes:
+            parts.append((start, index))
+            start = index
+            current = 0
+        current += size
+    if start < len(page_sizes):
+        parts.append((start, len(page_sizes)))
+    return parts
+
+def get_part_path(output_path, part_number):
+    """Retorna o caminho de uma parte: documento.pdf → documento_parte01.pdf"""
+    output_path = Path(output_path)
+    return output_path.with_name(f"{output_path.stem}_parte{part_number:02d}{output_path.suffix}")
+
+def write_pdf_parts(page_sizes, max_bytes, max_size_mb, make_job, build_part, workers=None):
+    """
+    Divide as páginas em partes (documento_parte01.pdf, ...) com até max_size_mb cada
+    e as grava em paralelo: build_part(make_job(número, início, fim)) roda em processo
+    separado e retorna o caminho da parte. A divisão parte de max_bytes (estimativa
+    a partir de page_sizes); se alguma parte passar do limite, é refeita com uma margem maior
+    Retorna os caminhos das partes
+    """
+    for attempt in range(3):
+        ranges = partition_pages_by_size(page_sizes, max_bytes)
+        jobs = [make_job(number, start, end) for number, (start, end) in enumerate(ranges, 1)]
+        
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            part_paths = list(executor.map(build_part, jobs))
+        
+        largest = max(get_file_size_mb(part_path) for part_path in part_paths)
+        if largest <= max_size_mb or all(end - start == 1 for start, end in ranges):
+            break
+        
+        for part_path in part_paths:
+            os.remove(part_path)
+        max_bytes *= max_size_mb / largest * 0.95
+    
+    for (start, end), part_path in zip(ranges, part_paths):
+        part_size = get_file_size_mb(part_path)
+        status_icon = "✅" if part_size <= max_size_mb else "⚠️"
+        print(f"     {status_icon} {Path(part_path).name}: páginas {start + 1}-{end}, {part_size:.2f}MB")
+    
+    return part_paths
+
+def find_pdf_parts(output_path):
+    """
+    Retorna os arquivos gerados para um PDF: ele próprio ou suas partes
+    """
+    output_path = Path(output_path)
+    if output_path.exists():
+        return [output_path]
+    return sorted(output_path.parent.glob(f"{output_path.stem}_parte*{output_path.suffix}"))
+
+def remove_pdf_outputs(output_path):
+    """Remove saídas anteriores (PDF único ou partes) de um documento"""
+    output_path = Path(output_path)
+    for old_file in find_pdf_parts(output_path):
+        old_file.unlink()
+    if output_path.exists():
+        output_path.unlink()
+
+class PipelineMetrics:
+    """
+    Profundidade das filas entre os estágios do pipeline, amostrada a cada item consumido
+    Fila quase sempre cheia: o estágio consumidor é o gargalo
+    Fila quase sempre vazia: o estágio produtor é o gargalo
+    """
+    
+    def __init__(self):
+        # "produtor → consumidor" → [soma, amostras, máximo, capacidade]
+        self.queues = {}
+    
+    def record(self, queue_name, depth, capacity):
+        stats = self.queues.setdefault(queue_name, [0, 0, 0, capacity])
+        stats[0] += depth
+        stats[1] += 1
+        stats[2] = max(stats[2], depth)
+    
+    def report(self):
+        if not self.queues:
+            return
+        print("📊 FILAS DO PIPELINE (profundidade média / máxima / capacidade)")
+        for queue_name, (total, samples, peak, capacity) in self.queues.items():
+            producer, consumer = queue_name.split(" → ")
+            average = total / samples
+            if average >= capacity * 0.75:
+                hint = f"cheia: {consumer} é o gargalo"
+            elif average <= capacity * 0.25:
+                hint = f"vazia: {producer} é o gargalo"
+            else:
+                hint = "equilibrada"
+            print(f"   {queue_name}: {average:.1f} / {peak} / {capacity} ({hint})")
+
+def iter_prefetched(items, load, prefetch, metrics=None, queue_name="leitura → processamento"):
+    """
+    Executa load(item) em uma thread separada, até prefetch itens à frente do consumidor
+    Gera pares (item, resultado de load) na ordem original; a profundidade da fila
+    é registrada em metrics com o nome queue_name
+    """
+    buffer = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+    
+    def reader():
+        for item in items:
+            if stop.is_set():
+                break
+            buffer.put((item, load(item)))
+        buffer.put(None)
+    
+    thread = threading.Thread(target=reader, daemon=True)
+    thread.start()
+    try:
+        while True:
+            if metrics:
+                metrics.record(queue_name, buffer.qsize(), prefetch)
+            item = buffer.get()
+            if item is None:
+                break
+            yield item
+    finally:
+        # Libera a thread de leitura se o consumidor parar antes do fim
+        stop.set()
+        while thread.is_alive():
+            try:
+                buffer.get_nowait()
+            except queue.Empty:
+                thread.join(0.01)
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Modo de observação de pastas (baixa latência)
+Usa o inotify do Linux para detectar novas subpastas de imagens e novos PDFs
+Aguarda o fim da escrita dos arquivos antes de processar
+Processa apenas o trabalho novo (a pasta só é varrida ao iniciar)
+"""
+
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import argparse
+from pathlib import Path
+
+import create_pdf_from_images as images_tool
+import compact_pdf as pdf_tool
+
+# Constantes do inotify (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+EVENT_HEADER = struct.Struct("iIII")
+
+class Inotify:
+    """
+    Acesso mínimo ao inotify do Linux via ctypes (sem dependências externas)
+    """
+
+    def __init__(self):
+        if not sys.platform.startswith("linux"):
+            raise OSError("O modo de observação usa inotify e só está disponível no Linux")
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "Falha ao iniciar o inotify")
+        self.watches = {}
+
+    def add_watch(self, path, mask):
+        """Observa um diretório e retorna o descritor da observação"""
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(str(path)), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"Falha ao observar '{path}'")
+        self.watches[wd] = Path(path)
+        return wd
+
+    def read_events(self, timeout):
+        """
+        Aguarda até timeout segundos por eventos
+        Retorna uma lista de (pasta_observada, máscara, nome)
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return []
+            raise
+
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            events.append((self.watches.get(wd), mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+class FolderWatcher:
+    """
+    Observa as pastas de entrada e despacha o trabalho novo para
+    create_pdf_from_images (pastas de imagens) e compress_pdf (PDFs)
+    """
+
+    def __init__(self, images_folder="imagens", images_output="pdfs_gerados",
+                 pdfs_folder="entrada", pdfs_output="saida", max_size_mb=5.0, settle_seconds=2.0,
+                 quality_target=None):
+        self.images_folder = Path(images_folder)
+        self.images_output = Path(images_output)
+        self.pdfs_folder = Path(pdfs_folder)
+        self.pdfs_output = Path(pdfs_output)
+        self.max_size_mb = max_size_mb
+        self.settle_seconds = settle_seconds
+        # Qualidade perceptual mínima das imagens (ex.: {'ssim': 0.95}); None usa só o tamanho
+        self.quality_target = quality_target
+        self.inotify = Inotify()
+        # Trabalho aguardando o fim da escrita: caminho → instante da última atividade
+        self.pending = {}
+
+    def start(self):
+        """Cria as pastas, registra as observações e varre o conteúdo já existente"""
+        for folder in (self.images_folder, self.images_output, self.pdfs_folder, self.pdfs_output):
+            folder.mkdir(exist_ok=True)
+
+        # IN_MODIFY mantém adiado um arquivo ZIP/TAR enquanto ainda está sendo copiado
+        self.inotify.add_watch(self.images_folder, IN_CREATE | IN_MOVED_TO | IN_CLOSE_WRITE | IN_MODIFY)
+        self.inotify.add_watch(self.pdfs_folder, IN_MOVED_TO | IN_CLOSE_WRITE | IN_MODIFY)
+        self.scan()
+
+    def scan(self):
+        """
+        Varre as pastas de entrada em busca de trabalho sem saída correspondente
+        Executada ao iniciar (e só repetida se o kernel descartar eventos)
+        """
+        now = time.monotonic()
+        for entry in self.images_folder.iterdir():
+            if entry.is_dir():
+                self.watch_image_folder(entry)
+                if not images_tool.find_pdf_parts(self.images_output / f"{entry.name}.pdf"):
+                    self.pending[entry] = now
+            elif images_tool.is_archive(entry) and not self.archive_has_output(entry):
+                self.pending[entry] = now
+        images_tool.close_archives()
+
+        for pdf_file in self.pdfs_folder.glob("*.pdf"):
+            if not pdf_tool.find_pdf_parts(self.pdfs_output / pdf_file.name):
+                self.pending[pdf_file] = now
+
+    def archive_has_output(self, archive):
+        """Verifica se todos os documentos de um arquivo ZIP/TAR já têm PDF gerado"""
+        try:
+            documents = images_tool.find_archive_documents(archive)
+        except Exception:
+            return False  # O erro de leitura é informado ao processar o arquivo
+        return all(images_tool.find_pdf_parts(self.images_output / f"{name}.pdf")
+                   for name, images in documents.items() if images)
+
+    def watch_image_folder(self, folder):
+        """Observa a escrita de imagens dentro de uma subpasta de documento"""
+        try:
+            self.inotify.add_watch(folder, IN_CREATE | IN_MOVED_TO | IN_CLOSE_WRITE | IN_MODIFY)
+        except OSError as e:
+            print(f"⚠️  {e}")
+
+    def handle_event(self, folder, mask, name):
+        """Registra a atividade de um evento do inotify"""
+        now = time.monotonic()
+        if mask & IN_Q_OVERFLOW:
+            print("⚠️  Eventos descartados pelo kernel, varrendo as pastas novamente...")
+            self.scan()
+            return
+        if folder is None or not name:
+            return
+
+        path = folder / name
+        if folder == self.images_folder:
+            if mask & IN_ISDIR:
+                self.watch_image_folder(path)
+                self.pending[path] = now
+            elif images_tool.is_archive(path):
+                self.pending[path] = now
+        elif folder == self.pdfs_folder:
+            if path.suffix.lower() == ".pdf":
+                self.pending[path] = now
+        elif folder.parent == self.images_folder:
+            # Nova imagem numa subpasta: o documento inteiro volta a esperar
+            self.pending[folder] = now
+
+    def dispatch_ready(self):
+        """Processa o trabalho cuja escrita terminou há pelo menos settle_seconds"""
+        now = time.monotonic()
+        ready = [path for path, last in self.pending.items() if now - last >= self.settle_seconds]
+        for path in sorted(ready):
+            del self.pending[path]
+            if not path.exists():
+                continue
+            if path.parent == self.pdfs_folder:
+                self.process_pdf(path)
+            elif path.is_dir():
+                self.process_image_folder(path.name, images_tool.find_folder_images(path))
+            else:
+                try:
+                    documents = images_tool.find_archive_documents(path)
+                except Exception as e:
+                    print(f"⚠️  Erro ao ler o arquivo '{path.name}': {e}")
+                    continue
+                for document_name, images in sorted(documents.items()):
+                    self.process_image_folder(document_name, images)
+                images_tool.close_archives()
+
+    def process_image_folder(self, name, images):
+        """Cria o PDF de uma pasta de imagens"""
+        if not images:
+            return
+        output_file = self.images_output / f"{name}.pdf"
+        print(f"📂 {name} ({len(images)} imagem(ns))")
+        start_time = time.time()
+        if images_tool.create_pdf_from_images(images, output_file, self.max_size_mb,
+                                              quality_target=self.quality_target):
+            print(f"   ✅ PDF criado em {time.time() - start_time:.1f}s: {output_file}")
+        else:
+            print(f"   ❌ Falha na criação do PDF")
+        print()
+
+    def process_pdf(self, pdf_file):
+        """Comprime um PDF recém-chegado"""
+        output_file = self.pdfs_output / pdf_file.name
+        print(f"📄 {pdf_file.name}")
+        start_time = time.time()
+        if pdf_tool.compress_pdf(pdf_file, output_file, self.max_size_mb, os.cpu_count() or 1,
+                                 quality_target=self.quality_target):
+            print(f"   ✅ Comprimido em {time.time() - start_time:.1f}s: {output_file}")
+        else:
+            print(f"   ❌ Falha na compressão")
+        print()
+
+    def run(self):
+        """Laço principal de observação"""
+        self.start()
+        print(f"👀 Observando '{self.images_folder}' e '{self.pdfs_folder}' (Ctrl+C para sair)\n")
+        try:
+            while True:
+                # Acorda a tempo de despachar o próximo trabalho pendente
+                timeout = self.settle_seconds if self.pending else None
+                for folder, mask, name in self.inotify.read_events(timeout):
+                    self.handle_event(folder, mask, name)
+                self.dispatch_ready()
+        finally:
+            self.inotify.close()
+
+def main():
+    """Função principal"""
+    parser = argparse.ArgumentParser(description="Observa as pastas de entrada e processa o trabalho novo")
+    parser.add_argument("--tamanho-max", type=float, default=5.0, help="tamanho máximo dos PDFs em MB")
+    parser.add_argument("--espera", type=float, default=2.0,
+                        help="segundos sem escrita antes de processar um item")
+    parser.add_argument("--ssim-min", type=float,
+                        help="SSIM mínimo de cada imagem (ex.: 0.95); usa a menor qualidade que o atinge")
+    parser.add_argument("--psnr-min", type=float,
+                        help="PSNR mínimo de cada imagem em dB (ex.: 38)")
+    args = parser.parse_args()
+    quality_target = {key: value for key, value in (("ssim", args.ssim_min), ("psnr", args.psnr_min))
+                      if value is not None} or None
+
+    print("👀 MODO DE OBSERVAÇÃO DE PASTAS")
+    print("=" * 35)
+    print(f"📋 Imagens: 'imagens' → 'pdfs_gerados'")
+    print(f"📋 PDFs: 'entrada' → 'saida'")
+    print(f"📋 LIMITE MÁXIMO: {args.tamanho_max}MB")
+    if quality_target:
+        print("📋 QUALIDADE MÍNIMA: " + ", ".join(f"{key.upper()} ≥ {value}" for key, value in quality_target.items()))
+    print()
+
+    try:
+        FolderWatcher(max_size_mb=args.tamanho_max, settle_seconds=args.espera,
+                      quality_target=quality_target).run()
+    except KeyboardInterrupt:
+        print("\n\n👋 Observação encerrada.")
+    except OSError as e:
+        print(f"❌ {e}")
+
+if __name__ == "__main__":
+    main()